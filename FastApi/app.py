@@ -1,27 +1,58 @@
-from fastapi import FastAPI, UploadFile, Form
+from fastapi import FastAPI, UploadFile, Form, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 import pandas as pd
 import numpy as np
 import faiss
 import pickle
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.decomposition import TruncatedSVD
 import os
+import threading
+
+from backends import VECTOR_BACKEND, FaissStore, drop_backend, merge_by_id, open_backend, write_backend
+from dedup import NUM_PERM, VIEW_COLUMNS, dedupe_csv, match_signatures
+from encoder import QueryEncoder, encoder_exists, export_encoder
+from jobs import FINAL_STATES, JobBusy, cancel_job, read_status, reap_finished, submit_job
+from knn_graph import (KNN_K, KnnGraph, build_knn_graph, graph_exists, load_graph_arrays, save_knn_graph,
+                       update_knn_graph)
+from mmap_store import atomic_write
+from ooc_train import CHUNK_SIZE, train_out_of_core
+from shards import ShardedSearcher, read_manifest, write_shards
+from suggest import TOP_N, SuggestIndex, build_suggest_index, suggest_index_exists
+from versions import MODELS_DIR, current_version, discard, link_or_copy, new_version_dir, publish
 
 app = FastAPI(title="YouTube Vector Search API")
 
 # ============================================================
 # 1️⃣ Global Variables
 # ============================================================
-INDEX_PATH = "models/faiss_index.bin"
-META_PATH = "models/metadata.pkl"
-TFIDF_PATH = "models/tfidf.pkl"
-SVD_PATH = "models/svd.pkl"
+# Serving artefacts, relative to the published version directory (versions.py), or to models/
+# itself for models ingested before versioned directories. The mmap'd files are shared by all
+# uvicorn workers through the page cache.
+INDEX_NAME = "faiss_index.bin"
+META_NAME = "metadata.pkl"
+TFIDF_NAME = "tfidf.pkl"
+SVD_NAME = "svd.pkl"
+VECTORS_NAME = "vectors.npy"
+META_BLOB_NAME = "metadata.bin"
+META_OFFSETS_NAME = "metadata_offsets.npy"
+ENCODER_NAME = "encoder"
+SUGGEST_NAME = "suggest"
+SHARDS_NAME = "shards"
+MINHASH_NAME = "minhash.npy"
+
+PARSE_CHUNK_SIZE = 5000
+TRANSCRIPT_COLUMNS = {"transcript", "cleaned_transcript", "raw_transcript"}
 
-index = None
+vector_store = None
 metadata = None
 tfidf_vectorizer = None
 svd_model = None
+query_encoder = None
+knn_graph = None
+suggest_index = None
+loaded_version = None
+sharded_searcher = None
+sharded_searcher_lock = threading.Lock()
 
 os.makedirs("models", exist_ok=True)
 
@@ -43,77 +74,467 @@ def build_faiss_index(df):
     dim = embeddings.shape[1]
     index = faiss.IndexFlatL2(dim)
     index.add(embeddings)
-    return index, df[["video_id", "title", "channel_title"]].to_dict(orient="records")
+    meta = df[["video_id", "title", "channel_title"]].to_dict(orient="records")
+    view_column = next((c for c in VIEW_COLUMNS if c in df.columns), None)
+    if view_column:
+        views = pd.to_numeric(df[view_column], errors="coerce").fillna(0).astype("int64")
+        for record, view_count in zip(meta, views):
+            record["view_count"] = int(view_count)
+    return index, meta
+
+
+def models_version():
+    """
+    The published version name; it only changes when a build has written everything.
+    Unversioned layout: the newest mtime over its artefacts.
+    """
+    name = current_version(MODELS_DIR)
+    if name is not None:
+        return name
+    names = [INDEX_NAME, META_NAME, TFIDF_NAME, SVD_NAME, VECTORS_NAME, META_BLOB_NAME, META_OFFSETS_NAME,
+             os.path.join(ENCODER_NAME, "config.json"), "knn_indptr.npy", os.path.join(SUGGEST_NAME, "keys.npy")]
+    paths = [os.path.join(MODELS_DIR, name) for name in names]
+    return max((os.stat(p).st_mtime_ns for p in paths if os.path.exists(p)), default=None)
+
+
+def version_dir(version):
+    return os.path.join(MODELS_DIR, version) if isinstance(version, str) else MODELS_DIR
+
+
+def single_index_exists(root):
+    """The mmap snapshot, or the FAISS/pickle files of an ingest made before it existed."""
+    if all(os.path.exists(os.path.join(root, n)) for n in [VECTORS_NAME, META_BLOB_NAME, META_OFFSETS_NAME]):
+        return True
+    return os.path.exists(os.path.join(root, INDEX_NAME)) and os.path.exists(os.path.join(root, META_NAME))
+
+
+def shard_manifest(root):
+    return read_manifest(os.path.join(root, SHARDS_NAME))
+
+
+def load_models():
+    """Open the vector store, metadata and encoders, reopening them if another worker re-ingested.
+    A sharded deployment may have no single index; only the encoders are needed then."""
+    global vector_store, metadata, tfidf_vectorizer, svd_model, query_encoder, knn_graph, suggest_index
+    global loaded_version
+
+    version = models_version()
+    if (query_encoder is not None or tfidf_vectorizer is not None) and version == loaded_version:
+        return
+    root = version_dir(version)
+
+    # The FAISS snapshot backs /similar and is the search index unless VECTOR_BACKEND selects another store
+    snapshot = FaissStore(root)
+    metadata = snapshot.metadata
+    knn_graph = KnnGraph(root) if os.path.exists(os.path.join(root, VECTORS_NAME)) and graph_exists(root) else None
+    if vector_store is not None:
+        vector_store.close()
+    vector_store = snapshot if VECTOR_BACKEND == "faiss" else open_backend(VECTOR_BACKEND, root)
+
+    suggest_dir = os.path.join(root, SUGGEST_NAME)
+    suggest_index = SuggestIndex(suggest_dir) if suggest_index_exists(suggest_dir) else None
+
+    encoder_dir = os.path.join(root, ENCODER_NAME)
+    if encoder_exists(encoder_dir):
+        # Memory-mapped arrays, no sklearn import or unpickling at serving time
+        query_encoder = QueryEncoder(encoder_dir)
+        tfidf_vectorizer = svd_model = None
+    else:
+        # Models ingested before the pickle-free export; run `python encoder.py` to convert them
+        query_encoder = None
+        with open(os.path.join(root, TFIDF_NAME), "rb") as f:
+            tfidf_vectorizer = pickle.load(f)
+        with open(os.path.join(root, SVD_NAME), "rb") as f:
+            svd_model = pickle.load(f)
+    loaded_version = version
+
+
+def encode_query(query):
+    if query_encoder is not None:
+        return query_encoder.transform([query]).astype("float32")
+    return svd_model.transform(tfidf_vectorizer.transform([query])).astype("float32")
+
+
+def get_sharded_searcher(root):
+    """Shard worker pool for this API worker, or None when the snapshot in `root` is not sharded."""
+    with sharded_searcher_lock:
+        return _open_sharded_searcher(root)
+
+
+def _open_sharded_searcher(root):
+    global sharded_searcher
+
+    shard_dir = os.path.join(root, SHARDS_NAME)
+    manifest = read_manifest(shard_dir)
+    if manifest is None:
+        if sharded_searcher is not None:
+            sharded_searcher.close()
+            sharded_searcher = None
+        return None
+    if (sharded_searcher is None or sharded_searcher.root != shard_dir
+            or sharded_searcher.num_shards != manifest["num_shards"]):
+        if sharded_searcher is not None:
+            sharded_searcher.close()
+        sharded_searcher = ShardedSearcher(shard_dir)
+    return sharded_searcher
+
+
+@app.on_event("shutdown")
+def close_shards():
+    if sharded_searcher is not None:
+        sharded_searcher.close()
 
 
 # ============================================================
-# 3️⃣ API: Upload CSV + Build Vector Index
+# 3️⃣ API: Upload CSV + Build Vector Index (background job)
 # ============================================================
-@app.post("/ingest")
-async def ingest_data(file: UploadFile):
-    try:
-        df = pd.read_csv(file.file)
+def read_upload(csv_path, out_of_core, progress):
+    """Parse the spooled CSV in chunks; out-of-core mode leaves transcripts on disk."""
+    usecols = (lambda c: c not in TRANSCRIPT_COLUMNS) if out_of_core else None
+    total = os.path.getsize(csv_path)
+    chunks = []
+    with open(csv_path, "rb") as f:
+        for chunk in pd.read_csv(f, usecols=usecols, chunksize=PARSE_CHUNK_SIZE):
+            chunks.append(chunk)
+            progress("parsing", f.tell(), total, "bytes")
+    df = pd.concat(chunks, ignore_index=True)
+    if not out_of_core:
         df["transcript"] = df["transcript"].fillna("")
-        index, meta = build_faiss_index(df)
+    return df
+
+
+def write_single_index(root, embeddings, meta, graph, signatures=None):
+    """
+    Write the unsharded index into version directory `root`: the FAISS snapshot, the k-NN graph
+    and, after dedup, the MinHash signatures of its rows for later upserts.
+    """
+    FaissStore(root).replace(embeddings, meta)
+    aliases = [(dup, row) for row, rec in enumerate(meta) for dup in rec.get("duplicate_ids", [])]
+    save_knn_graph(root, graph, [rec.get("video_id") for rec in meta], aliases)
+    if signatures is not None:
+        atomic_write(os.path.join(root, MINHASH_NAME), lambda f: np.save(f, signatures))
+
+
+def stored_signatures(root, num_rows):
+    """MinHash signatures saved with the snapshot in `root`, or None (older ingest, or dedup=false)."""
+    path = os.path.join(root, MINHASH_NAME)
+    if not os.path.exists(path):
+        return None
+    signatures = np.load(path, mmap_mode="r")
+    return signatures if len(signatures) == num_rows else None
+
+
+def fold_duplicates(records, stored, embeddings, meta, signatures):
+    """
+    Upload rows with a new video_id that are near-duplicates of an indexed row become aliases
+    of it (added to its duplicate_ids, like dedup within one upload) instead of new rows. The
+    indexed row stays canonical, so its row and neighbours do not move.
+    Returns the remaining (embeddings, meta, signatures) and the number of rows folded.
+    """
+    row_of = {rec.get("video_id"): i for i, rec in enumerate(records)}
+    fresh = [j for j, rec in enumerate(meta) if rec.get("video_id") not in row_of]
+    matched = match_signatures(stored, signatures[fresh]) if fresh else []
+    folded = set()
+    for j, row in zip(fresh, matched):
+        if row < 0:
+            continue
+        rec = records[row]
+        ids = rec.get("duplicate_ids", []) + [meta[j].get("video_id")] + meta[j].get("duplicate_ids", [])
+        records[row] = dict(rec, duplicate_ids=list(dict.fromkeys(ids)))
+        folded.add(j)
+    kept = [j for j in range(len(meta)) if j not in folded]
+    return embeddings[kept], [meta[j] for j in kept], signatures[kept], len(folded)
+
+
+def publish_build(write_fn):
+    """
+    Run `write_fn(version_dir)` on a fresh version directory and publish it; workers switch to
+    it on their next request. On any error the directory is dropped and nothing changes.
+    """
+    out = new_version_dir(MODELS_DIR)
+    try:
+        result = write_fn(out)
+        pruned = publish(out, MODELS_DIR)
+    except BaseException:
+        discard(out)
+        drop_backend(VECTOR_BACKEND, out)
+        raise
+    for name in pruned:
+        drop_backend(VECTOR_BACKEND, os.path.join(MODELS_DIR, name))
+    return result
+
+
+def upsert_rows(embeddings, meta, progress, signatures=None):
+    """
+    Merge uploaded rows into the current single index by video_id (replace or append) and
+    refresh the k-NN graph incrementally. With MinHash `signatures` of the upload (dedup on),
+    new rows that near-duplicate an indexed row are folded into its duplicate_ids instead.
+    The TF-IDF/SVD encoders are kept as they are.
+    """
+    root = version_dir(models_version())
+    if shard_manifest(root) is not None:
+        raise ValueError("Upsert ingest is only supported for the single (unsharded) index")
+    if not all(os.path.exists(os.path.join(root, n)) for n in [VECTORS_NAME, META_BLOB_NAME, META_OFFSETS_NAME]):
+        raise ValueError("Upsert needs an existing index. Please run a full ingest first.")
+
+    old_vectors, records = FaissStore(root).rows(embeddings.shape[1])
+    if old_vectors.shape[1] != embeddings.shape[1]:
+        raise ValueError(f"Embedding size {embeddings.shape[1]} does not match the index ({old_vectors.shape[1]})")
+    stored = stored_signatures(root, len(records))
+    folded = 0
+    if signatures is not None and stored is not None:
+        progress("dedup against index")
+        embeddings, meta, signatures, folded = fold_duplicates(records, stored, embeddings, meta, signatures)
+    all_vectors, records, changed, new_start = merge_by_id(old_vectors, records, embeddings, meta)
+
+    # Signatures of the merged rows; rows without one (older ingest, dedup=false) are zeros
+    all_signatures = np.zeros((len(records), NUM_PERM), dtype=np.uint32)
+    if stored is not None:
+        all_signatures[:len(stored)] = stored
+    row_of = {rec.get("video_id"): i for i, rec in enumerate(records)}
+    for j, rec in enumerate(meta):
+        all_signatures[row_of[rec.get("video_id")]] = signatures[j] if signatures is not None else 0
+
+    if graph_exists(root):
+        graph = update_knn_graph(load_graph_arrays(root), all_vectors, sorted(changed), new_start,
+                                 progress=progress)
+    else:
+        graph = build_knn_graph(all_vectors, progress=progress)
+
+    progress("writing")
 
-        # Save FAISS and metadata
-        faiss.write_index(index, INDEX_PATH)
-        with open(META_PATH, "wb") as f:
-            pickle.dump(meta, f)
+    def write(out):
+        write_single_index(out, all_vectors, records, graph, all_signatures)
+        suggest = build_suggest_index(records, os.path.join(out, SUGGEST_NAME))
+        # The encoders do not change on upsert
+        for name in [ENCODER_NAME, TFIDF_NAME, SVD_NAME]:
+            if os.path.exists(os.path.join(root, name)):
+                link_or_copy(os.path.join(root, name), os.path.join(out, name))
+        # The backend snapshot of this version gets every row, not just the upload
+        backend = write_backend(VECTOR_BACKEND, out, all_vectors, records)
+        return {"records": len(meta), "updated": len(changed), "added": len(records) - new_start,
+                "duplicates_of_indexed": folded, "total": len(records), "backend": backend, "suggest": suggest}
 
-        # Train TF-IDF + SVD
+    return publish_build(write)
+
+
+def run_ingest(csv_path, options, progress):
+    """
+    The whole build, run in the job process. Files go to a new version directory that is only
+    published at the end, so a cancelled or failed build leaves the served index untouched.
+    """
+    num_shards = options["num_shards"]
+    shard_by = options["shard_by"]
+    rebuild_shards = options["rebuild_shards"]
+    out_of_core = options["out_of_core"]
+    if options["upsert"] and (num_shards > 0 or rebuild_shards):
+        raise ValueError("upsert cannot be combined with num_shards/rebuild_shards")
+    if VECTOR_BACKEND != "faiss" and (num_shards > 0 or rebuild_shards):
+        raise ValueError(f"num_shards/rebuild_shards need VECTOR_BACKEND=faiss (this deployment uses {VECTOR_BACKEND})")
+
+    df = read_upload(csv_path, out_of_core, progress)
+
+    # Near-duplicate transcripts: index one canonical row per cluster
+    keep, dedup_report, signatures = None, None, None
+    if options["dedup"]:
+        keep, alternates, dedup_report, signatures = dedupe_csv(csv_path, df, progress)
+        df = df[keep].reset_index(drop=True)
+        alternates = [alts for alts, kept in zip(alternates, keep) if kept]
+        if signatures is not None:
+            signatures = signatures[keep]
+
+    progress("indexing", 0, len(df))
+    index, meta = build_faiss_index(df)
+    embeddings = index.reconstruct_n(0, index.ntotal)
+    progress("indexing", len(df), len(df))
+    if dedup_report is not None:
+        for record, alts in zip(meta, alternates):
+            if alts:
+                record["duplicate_ids"] = alts
+        dedup_report["index_bytes_saved"] = dedup_report["rows_removed"] * embeddings.shape[1] * 4
+
+    if options["upsert"]:
+        result = upsert_rows(embeddings, meta, progress, signatures)
+        result["dedup"] = dedup_report
+        return result
+
+    if rebuild_shards:
+        # Rewrite only the listed shards from this upload; encoders stay as they are
+        only = [int(s) for s in rebuild_shards.split(",") if s.strip()]
+        progress("writing")
+        shard_dir = os.path.join(version_dir(models_version()), SHARDS_NAME)
+        written = write_shards(shard_dir, embeddings, meta, num_shards, shard_by, only=only)
+        return {"records": len(df), "shards": written, "dedup": dedup_report}
+
+    # Train TF-IDF + SVD (sklearn is only needed here, not for serving)
+    if out_of_core:
+        tfidf, svd = train_out_of_core(csv_path, chunk_size=options["chunk_size"],
+                                       progress=progress, total_docs=len(df), keep=keep)
+    else:
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.decomposition import TruncatedSVD
+
+        progress("tfidf", 0, len(df))
         df["combined_text"] = df["title"].astype(str) + " " + df["transcript"].astype(str)
         tfidf = TfidfVectorizer(stop_words="english", max_features=5000)
         X = tfidf.fit_transform(df["combined_text"])
+        progress("svd", 0, len(df))
         svd = TruncatedSVD(n_components=100, random_state=42)
         svd.fit(X)
 
+    graph = build_knn_graph(embeddings, progress=progress) if num_shards == 0 else None
+
+    progress("writing")
+
+    def write(out):
+        result = {"records": len(df), "dedup": dedup_report}
+        if num_shards > 0:
+            result["shards"] = write_shards(os.path.join(out, SHARDS_NAME), embeddings, meta, num_shards, shard_by)
+        else:
+            write_single_index(out, embeddings, meta, graph, signatures)
+            result["backend"] = write_backend(VECTOR_BACKEND, out, embeddings, meta)
+        result["suggest"] = build_suggest_index(meta, os.path.join(out, SUGGEST_NAME))
+
         # Save models
-        with open(TFIDF_PATH, "wb") as f:
-            pickle.dump(tfidf, f)
-        with open(SVD_PATH, "wb") as f:
-            pickle.dump(svd, f)
+        atomic_write(os.path.join(out, TFIDF_NAME), lambda f: pickle.dump(tfidf, f))
+        atomic_write(os.path.join(out, SVD_NAME), lambda f: pickle.dump(svd, f))
+        export_encoder(tfidf, svd, os.path.join(out, ENCODER_NAME))
+        return result
+
+    return publish_build(write)
+
 
-        return {"message": "✅ Data ingested successfully", "records": len(df)}
+@app.post("/ingest", status_code=202)
+async def ingest_data(
+    file: UploadFile,
+    num_shards: int = Form(0),
+    shard_by: str = Form("video_id"),
+    rebuild_shards: str = Form(""),
+    out_of_core: bool = Form(False),
+    chunk_size: int = Form(CHUNK_SIZE),
+    dedup: bool = Form(True),
+    upsert: bool = Form(False),
+):
+    options = {
+        "num_shards": num_shards,
+        "shard_by": shard_by,
+        "rebuild_shards": rebuild_shards,
+        "out_of_core": out_of_core,
+        "chunk_size": chunk_size,
+        "dedup": dedup,
+        "upsert": upsert,
+    }
+    try:
+        # Spooling is blocking file I/O; keep it off the event loop
+        status = await run_in_threadpool(submit_job, file.file, run_ingest, options)
+    except JobBusy as e:
+        return JSONResponse(status_code=409, content={"error": str(e), "job_id": e.job_id})
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+    return {"message": "✅ Ingest job started", "job_id": status["job_id"], "status_url": f"/jobs/{status['job_id']}"}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    reap_finished()
+    status = read_status(job_id)
+    if status is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown job id"})
+    return status
+
+
+@app.delete("/jobs/{job_id}")
+async def delete_job(job_id: str):
+    status = cancel_job(job_id)
+    if status is None:
+        return JSONResponse(status_code=404, content={"error": "Unknown job id"})
+    if status["state"] in FINAL_STATES:
+        return JSONResponse(status_code=409, content={"error": f"Job already {status['state']}", "job_id": job_id})
+    return {"message": "Cancellation requested", "job_id": job_id}
+
 
 # ============================================================
 # 4️⃣ API: Search Query
 # ============================================================
 @app.get("/search")
-async def search_videos(query: str, k: int = 5):
-    global index, metadata, tfidf_vectorizer, svd_model
-
-    if not all([os.path.exists(INDEX_PATH), os.path.exists(META_PATH)]):
+async def search_videos(query: str, k: int = 5, channel: str = None):
+    root = version_dir(models_version())
+    # Starting shard processes takes seconds; keep it off the event loop
+    searcher = await run_in_threadpool(get_sharded_searcher, root)
+    if searcher is None and not single_index_exists(root):
         return JSONResponse(status_code=400, content={"error": "No FAISS index found. Please ingest data first."})
 
-    if index is None:
-        index = faiss.read_index(INDEX_PATH)
-        with open(META_PATH, "rb") as f:
-            metadata = pickle.load(f)
-        with open(TFIDF_PATH, "rb") as f:
-            tfidf_vectorizer = pickle.load(f)
-        with open(SVD_PATH, "rb") as f:
-            svd_model = pickle.load(f)
+    load_models()
 
     # Encode query
-    query_tfidf = tfidf_vectorizer.transform([query])
-    query_emb = svd_model.transform(query_tfidf).astype("float32")
+    query_emb = encode_query(query)
+
+    where = {"channel_title": channel} if channel else None
+    missing_shards = []
+    if searcher is not None:
+        # Scatter to the shard processes off the event loop, gather within the timeout
+        hits, missing_shards = await run_in_threadpool(searcher.search, query_emb, k, None, where)
+    else:
+        hits = vector_store.search(query_emb, k, where)
+
+    results = []
+    for rank, (distance, data) in enumerate(hits):
+        results.append({
+            "rank": rank + 1,
+            "video_id": data.get("video_id"),
+            "title": data.get("title"),
+            "channel": data.get("channel_title"),
+            "duplicate_ids": data.get("duplicate_ids", []),
+            "similarity_score": round(1 / (1 + distance), 4)
+        })
+
+    response = {"query": query, "results": results}
+    if missing_shards:
+        response["partial"] = True
+        response["missing_shards"] = missing_shards
+    return response
+
+
+# ============================================================
+# 5️⃣ API: Prefix Suggestions
+# ============================================================
+@app.get("/suggest")
+async def suggest_titles(prefix: str, n: int = Query(TOP_N, ge=1, le=TOP_N)):
+    if not suggest_index_exists(os.path.join(version_dir(models_version()), SUGGEST_NAME)):
+        return JSONResponse(status_code=400, content={"error": "No suggestion index found. Please ingest data first."})
+
+    load_models()
+    return {"prefix": prefix, "suggestions": suggest_index.suggest(prefix, n)}
+
+
+# ============================================================
+# 6️⃣ API: Similar Videos (precomputed k-NN graph)
+# ============================================================
+@app.get("/similar/{video_id}")
+async def similar_videos(video_id: str, k: int = KNN_K):
+    root = version_dir(models_version())
+    sharded = shard_manifest(root) is not None
+    if not sharded and os.path.exists(os.path.join(root, VECTORS_NAME)):
+        load_models()
+    if sharded or knn_graph is None:
+        return JSONResponse(status_code=400, content={"error": "No similarity graph found. Please ingest data (without num_shards) first."})
 
-    distances, indices = index.search(query_emb, k)
-    scores = 1 / (1 + distances[0])
+    row = knn_graph.row_of(video_id)
+    if row is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown video_id: {video_id}"})
 
+    neighbors, distances = knn_graph.neighbors(row, k)
     results = []
-    for rank, i in enumerate(indices[0]):
-        data = metadata[i]
+    for rank, (i, distance) in enumerate(zip(neighbors, distances)):
+        data = metadata[int(i)]
         results.append({
             "rank": rank + 1,
             "video_id": data.get("video_id"),
             "title": data.get("title"),
             "channel": data.get("channel_title"),
-            "similarity_score": round(float(scores[rank]), 4)
+            "duplicate_ids": data.get("duplicate_ids", []),
+            "similarity_score": round(1 / (1 + float(distance)), 4)
         })
 
-    return {"query": query, "results": results}
+    return {"video_id": video_id, "results": results}
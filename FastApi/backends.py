@@ -0,0 +1,405 @@
+"""
+backends.py
+- Vector store backends /search can serve from, selected per deployment with
+  VECTOR_BACKEND=faiss (default) or VECTOR_BACKEND=chroma.
+- Both implement the same VectorBackend interface: add / upsert / delete / replace by
+  video_id, search(xq, k, where) returning (distance, record) hits, and filter(where) on
+  metadata equality (e.g. {"channel_title": "TED"}).
+- FaissStore is the memory-mapped single index in models/ (vectors.npy + metadata blob;
+  faiss_index.bin / metadata.pkl from older ingests are still read, but no longer written).
+  Filters on an indexed field (FILTER_FIELDS, a value -> rows index written next to the
+  vectors) search only that field's rows; other filters over-fetch and widen until k
+  matches are found.
+- ChromaStore is a Chroma collection using L2 distance, so similarity scores mean the same on
+  both backends. Chroma metadata only holds scalars: None values are dropped and lists are
+  stored as JSON.
+- Every ingest loads Chroma into a store of its own version directory (versions.py) and records
+  it in backend.json there: an embedded PersistentClient database in <version>/chroma, or with
+  CHROMA_HOST a collection "youtube_videos_<version>" on that Chroma server. Readers open the
+  store named by the published version, so a failed build never touches the served one, and
+  nothing writes to a published store. PersistentClient is not safe across processes, so the
+  embedded database is for a single API worker; multi-worker deployments set CHROMA_HOST.
+- /ingest fills the selected backend from the same parsed upload, so there is one loading
+  pipeline; bench_backends.py drives both through this interface.
+"""
+
+import json
+import os
+import pickle
+
+import faiss
+import numpy as np
+
+from mmap_store import (MmapFieldIndex, MmapIndex, MmapMetadata, atomic_write, field_index_exists,
+                        save_field_index, save_metadata, save_vectors)
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "faiss")
+CHROMA_DIR = os.getenv("CHROMA_DIR", "models/chroma")
+CHROMA_COLLECTION = "youtube_videos"
+CHROMA_HOST = os.getenv("CHROMA_HOST")  # Chroma server (chromadb.HttpClient); unset = embedded database
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+CHROMA_NAME = "chroma"
+BACKEND_MANIFEST = "backend.json"
+CHROMA_BATCH = 1000
+FILTER_OVERSAMPLE = 4
+FILTER_FIELDS = ["channel_title"]
+_JSON_SUFFIX = "__json"
+
+
+def matches(record, where):
+    return all(record.get(key) == value for key, value in where.items())
+
+
+def open_field_indexes(root):
+    return {field: MmapFieldIndex(root, field) for field in FILTER_FIELDS if field_index_exists(root, field)}
+
+
+def search_where(index, metadata, field_indexes, xq, k, where):
+    """
+    The k nearest rows to xq[0] matching `where`, as (distance, record). With an indexed string
+    field in `where` only that field's rows are searched; otherwise the search widens until k
+    matches are found or every row was seen.
+    """
+    ntotal = index.ntotal if index is not None else 0
+    if ntotal == 0 or k <= 0:
+        return []
+    indexed = next((f for f, v in where.items() if f in field_indexes and isinstance(v, str)), None)
+    if indexed is not None and isinstance(index, MmapIndex):
+        rows = field_indexes[indexed].rows(where[indexed])
+        rest = {f: v for f, v in where.items() if f != indexed}
+        distances, indices = index.search(xq[:1], len(rows) if rest else k, rows)
+        hits = [(float(d), metadata[int(i)]) for d, i in zip(distances[0], indices[0]) if i >= 0]
+        return [hit for hit in hits if matches(hit[1], rest)][:k]
+
+    fetch = min(k * FILTER_OVERSAMPLE, ntotal)
+    while True:
+        distances, indices = index.search(xq[:1], fetch)
+        hits = [(float(d), metadata[int(i)]) for d, i in zip(distances[0], indices[0]) if i >= 0]
+        hits = [hit for hit in hits if matches(hit[1], where)]
+        if len(hits) >= k or fetch >= ntotal:
+            return hits[:k]
+        fetch = min(fetch * FILTER_OVERSAMPLE, ntotal)
+
+
+def merge_by_id(vectors, records, embeddings, meta):
+    """
+    Upsert `meta`/`embeddings` into `records`/`vectors` by video_id (replace or append). A
+    replaced record keeps the duplicate_ids it had, plus any the new one brings.
+    Returns (all vectors, all records, rows that were replaced, first appended row).
+    """
+    vectors = np.array(vectors, dtype="float32")
+    records = list(records)
+    new_start = len(records)
+    row_of = {rec.get("video_id"): i for i, rec in enumerate(records)}
+
+    changed, new_vectors = set(), []
+    for j, rec in enumerate(meta):
+        row = row_of.get(rec.get("video_id"))
+        if row is None:
+            row_of[rec.get("video_id")] = len(records)
+            records.append(rec)
+            new_vectors.append(embeddings[j])
+        elif row < new_start:
+            vectors[row] = embeddings[j]
+            records[row] = _keep_duplicates(records[row], rec)
+            changed.add(row)
+        else:
+            new_vectors[row - new_start] = embeddings[j]
+            records[row] = _keep_duplicates(records[row], rec)
+    all_vectors = np.vstack([vectors] + [v[None, :] for v in new_vectors]).astype("float32")
+    return all_vectors, records, changed, new_start
+
+
+def _keep_duplicates(old, rec):
+    ids = list(dict.fromkeys(old.get("duplicate_ids", []) + rec.get("duplicate_ids", [])))
+    ids = [i for i in ids if i != rec.get("video_id")]
+    return dict(rec, duplicate_ids=ids) if ids else rec
+
+
+class VectorBackend:
+    """Interface of a vector store; records are metadata dicts identified by their "video_id"."""
+
+    name = None
+
+    def count(self):
+        raise NotImplementedError
+
+    def add(self, embeddings, records):
+        """Insert new rows (video_ids not yet in the store)."""
+        raise NotImplementedError
+
+    def upsert(self, embeddings, records):
+        """Replace rows whose video_id exists, insert the others."""
+        raise NotImplementedError
+
+    def delete(self, video_ids):
+        raise NotImplementedError
+
+    def replace(self, embeddings, records):
+        """Make the store hold exactly these rows (full ingest)."""
+        raise NotImplementedError
+
+    def search(self, xq, k, where=None):
+        """The k nearest rows to the first query row as (squared L2 distance, record), nearest first."""
+        raise NotImplementedError
+
+    def filter(self, where, limit=None):
+        """Records whose metadata equals every key/value in `where`."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class FaissStore(VectorBackend):
+    name = "faiss"
+
+    def __init__(self, root="models"):
+        self.root = root
+        self.vectors_path = os.path.join(root, "vectors.npy")
+        self.blob_path = os.path.join(root, "metadata.bin")
+        self.offsets_path = os.path.join(root, "metadata_offsets.npy")
+        self.index_path = os.path.join(root, "faiss_index.bin")
+        self.meta_path = os.path.join(root, "metadata.pkl")
+        self.index, self.metadata, self.field_indexes = None, [], {}
+        if all(os.path.exists(p) for p in [self.vectors_path, self.blob_path, self.offsets_path]):
+            self.index = MmapIndex(self.vectors_path)
+            self.metadata = MmapMetadata(self.blob_path, self.offsets_path)
+            self.field_indexes = open_field_indexes(root)
+        elif os.path.exists(self.index_path):
+            # Artefacts written before the mmap layout existed
+            self.index = faiss.read_index(self.index_path)
+            with open(self.meta_path, "rb") as f:
+                self.metadata = pickle.load(f)
+
+    def count(self):
+        return self.index.ntotal if self.index is not None else 0
+
+    def search(self, xq, k, where=None):
+        if where:
+            return search_where(self.index, self.metadata, self.field_indexes, xq, k, where)
+        if self.count() == 0 or k <= 0:
+            return []
+        distances, indices = self.index.search(xq[:1], k)
+        return [(float(d), self.metadata[int(i)]) for d, i in zip(distances[0], indices[0]) if i >= 0]
+
+    def filter(self, where, limit=None):
+        indexed = next((f for f, v in where.items() if f in self.field_indexes and isinstance(v, str)), None)
+        if indexed is not None:
+            candidates = (self.metadata[int(i)] for i in self.field_indexes[indexed].rows(where[indexed]))
+        else:
+            candidates = iter(self.metadata)
+        found = []
+        for rec in candidates:
+            if matches(rec, where):
+                found.append(rec)
+                if limit is not None and len(found) >= limit:
+                    break
+        return found
+
+    def rows(self, dim):
+        """All vectors (an in-memory copy) and records currently stored."""
+        if self.index is None:
+            return np.zeros((0, dim), dtype="float32"), []
+        if isinstance(self.index, MmapIndex):
+            vectors = np.array(self.index.xb, dtype="float32")
+        else:
+            vectors = self.index.reconstruct_n(0, self.index.ntotal)
+        return vectors, list(self.metadata)
+
+    def replace(self, embeddings, records):
+        """Swap in a new snapshot (field indexes, metadata, then vectors)."""
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+        os.makedirs(self.root, exist_ok=True)
+        for field in FILTER_FIELDS:
+            save_field_index(self.root, records, field)
+        save_metadata(self.blob_path, self.offsets_path, records)
+        save_vectors(self.vectors_path, embeddings)
+        self.index = MmapIndex(self.vectors_path)
+        self.metadata = MmapMetadata(self.blob_path, self.offsets_path)
+        self.field_indexes = open_field_indexes(self.root)
+
+    def add(self, embeddings, records):
+        vectors, current = self.rows(embeddings.shape[1])
+        self.replace(np.vstack([vectors, embeddings]), current + list(records))
+
+    def upsert(self, embeddings, records):
+        vectors, current = self.rows(embeddings.shape[1])
+        vectors, current, _, _ = merge_by_id(vectors, current, embeddings, records)
+        self.replace(vectors, current)
+
+    def delete(self, video_ids):
+        if self.index is None:
+            return
+        vectors, current = self.rows(self.index.d)
+        drop = set(video_ids)
+        keep = [i for i, rec in enumerate(current) if rec.get("video_id") not in drop]
+        self.replace(vectors[keep], [current[i] for i in keep])
+
+
+def _to_chroma(record):
+    meta = {}
+    for key, value in record.items():
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            continue
+        if isinstance(value, (list, tuple, dict)):
+            meta[key + _JSON_SUFFIX] = json.dumps(value, ensure_ascii=False, default=str)
+        elif isinstance(value, np.integer):
+            meta[key] = int(value)
+        elif isinstance(value, np.floating):
+            meta[key] = float(value)
+        elif isinstance(value, (str, int, float, bool)):
+            meta[key] = value
+        else:
+            meta[key] = str(value)
+    return meta
+
+
+def _from_chroma(video_id, meta):
+    record = {"video_id": video_id}
+    for key, value in (meta or {}).items():
+        if key.endswith(_JSON_SUFFIX):
+            record[key[:-len(_JSON_SUFFIX)]] = json.loads(value)
+        else:
+            record[key] = value
+    return record
+
+
+def _chroma_where(where):
+    if not where:
+        return None
+    clauses = [{key: value} for key, value in where.items()]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class ChromaStore(VectorBackend):
+    name = "chroma"
+
+    def __init__(self, persist_dir=CHROMA_DIR, collection_name=CHROMA_COLLECTION, host=CHROMA_HOST):
+        self.client = _chroma_client(persist_dir, host)
+        self.collection_name = collection_name
+        # Squared L2 like IndexFlatL2
+        self.collection = self.client.get_or_create_collection(name=collection_name, metadata={"hnsw:space": "l2"})
+
+    def count(self):
+        return self.collection.count()
+
+    def _write(self, method, embeddings, records):
+        # Chroma rejects repeated ids within a call; the last row for a video_id wins
+        row_of = {}
+        for j, rec in enumerate(records):
+            row_of[str(rec.get("video_id"))] = j
+        ids, rows = list(row_of), list(row_of.values())
+        embeddings = np.asarray(embeddings, dtype="float32")[rows]
+        metadatas = [_to_chroma(records[j]) for j in rows]
+        for start in range(0, len(ids), CHROMA_BATCH):
+            end = start + CHROMA_BATCH
+            method(ids=ids[start:end], embeddings=embeddings[start:end].tolist(), metadatas=metadatas[start:end])
+
+    def add(self, embeddings, records):
+        self._write(self.collection.add, embeddings, records)
+
+    def upsert(self, embeddings, records):
+        self._write(self.collection.upsert, embeddings, records)
+
+    def delete(self, video_ids):
+        ids = [str(v) for v in video_ids]
+        for start in range(0, len(ids), CHROMA_BATCH):
+            self.collection.delete(ids=ids[start:start + CHROMA_BATCH])
+
+    def replace(self, embeddings, records):
+        # Upsert then drop stale ids, so readers never see an empty or missing collection
+        self.upsert(embeddings, records)
+        keep = {str(rec.get("video_id")) for rec in records}
+        stale = [i for i in self.collection.get(include=[])["ids"] if i not in keep]
+        self.delete(stale)
+
+    def search(self, xq, k, where=None):
+        k = min(k, self.count())
+        if k <= 0:
+            return []
+        res = self.collection.query(
+            query_embeddings=np.asarray(xq[:1], dtype="float32").tolist(),
+            n_results=k,
+            where=_chroma_where(where),
+            include=["metadatas", "distances"],
+        )
+        return [(float(d), _from_chroma(i, m))
+                for i, d, m in zip(res["ids"][0], res["distances"][0], res["metadatas"][0])]
+
+    def filter(self, where, limit=None):
+        res = self.collection.get(where=_chroma_where(where), limit=limit, include=["metadatas"])
+        return [_from_chroma(i, m) for i, m in zip(res["ids"], res["metadatas"])]
+
+    def close(self):
+        # Drop the cached in-process system so a reopen reads what another process wrote
+        try:
+            from chromadb.api.client import SharedSystemClient
+            SharedSystemClient.clear_system_cache()
+        except (ImportError, AttributeError):
+            pass
+
+
+def _chroma_client(persist_dir, host):
+    import chromadb
+
+    if host:
+        return chromadb.HttpClient(host=host, port=CHROMA_PORT)
+    os.makedirs(persist_dir, exist_ok=True)
+    return chromadb.PersistentClient(path=persist_dir)
+
+
+def _snapshot_collection(root):
+    # One collection per version on a shared server; an embedded database has only this version
+    if CHROMA_HOST:
+        return f"{CHROMA_COLLECTION}_{os.path.basename(os.path.normpath(root))}"
+    return CHROMA_COLLECTION
+
+
+BACKENDS = {"faiss": FaissStore, "chroma": ChromaStore}
+
+
+def open_backend(name=VECTOR_BACKEND, root="models"):
+    """The store of version directory `root` for reading."""
+    if name == "faiss":
+        return FaissStore(root)
+    if name == "chroma":
+        manifest_path = os.path.join(root, BACKEND_MANIFEST)
+        if not os.path.exists(manifest_path):
+            # Loaded before version directories existed (or by vector_db.py)
+            return ChromaStore()
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        return ChromaStore(os.path.join(root, CHROMA_NAME), manifest["collection"])
+    raise ValueError(f"Unknown VECTOR_BACKEND {name!r}; expected one of {sorted(BACKENDS)}")
+
+
+def write_backend(name, root, embeddings, records):
+    """
+    Load all rows into a new store for unpublished version directory `root` and record it there.
+    Returns {"name", "count"}, or None for faiss (the snapshot in `root` is the store).
+    """
+    if name == "faiss":
+        return None
+    if name != "chroma":
+        raise ValueError(f"Unknown VECTOR_BACKEND {name!r}; expected one of {sorted(BACKENDS)}")
+    store = ChromaStore(os.path.join(root, CHROMA_NAME), _snapshot_collection(root))
+    try:
+        store.replace(embeddings, records)
+        count = store.count()
+    finally:
+        store.close()
+    manifest = {"name": name, "collection": store.collection_name}
+    atomic_write(os.path.join(root, BACKEND_MANIFEST), lambda f: json.dump(manifest, f), mode="w")
+    return {"name": name, "count": count}
+
+
+def drop_backend(name, root):
+    """Free the store of a discarded or pruned version (its directory is removed separately)."""
+    if name != "chroma" or not CHROMA_HOST:
+        return
+    try:
+        _chroma_client(None, CHROMA_HOST).delete_collection(_snapshot_collection(root))
+    except Exception:
+        # Never created (build failed before loading Chroma) or already gone
+        pass
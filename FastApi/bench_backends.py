@@ -0,0 +1,132 @@
+"""
+bench_backends.py
+- Common benchmark for the vector store backends in backends.py:
+  python bench_backends.py --rows 50000 --dim 100
+  python bench_backends.py --backends faiss      # only FAISS (e.g. chromadb not installed)
+- Every backend runs in its own spawned process on a throwaway directory, against the same
+  synthetic vectors and records, and reports:
+  ingest throughput (rows/s for one replace() of all rows), resident memory after ingest,
+  search latency p50 / p99 (plain and filtered by channel_title), upsert and delete time,
+  and recall@k against exact search.
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from backends import BACKENDS, ChromaStore, FaissStore
+
+
+def rss_mb():
+    """Current resident set size; falls back to the peak where /proc is not available."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, AttributeError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if peak > 2**30 else peak / 2**10
+
+
+def synthetic_rows(n, dim, seed=42):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((n, dim)).astype("float32")
+    records = [{
+        "video_id": f"vid_{i}",
+        "title": f"Video {i}",
+        "channel_title": f"Channel {rng.integers(0, n // 50 + 1)}",
+        "view_count": int(rng.pareto(1.2) * 1000),
+    } for i in range(n)]
+    return embeddings, records
+
+
+def percentiles(times):
+    times = np.array(times) * 1e3
+    return round(float(np.percentile(times, 50)), 3), round(float(np.percentile(times, 99)), 3)
+
+
+def run_backend(name, args, results):
+    embeddings, records = synthetic_rows(args.rows, args.dim)
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((args.queries, args.dim)).astype("float32")
+    channels = [records[i]["channel_title"] for i in rng.integers(0, len(records), args.queries)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base_rss = rss_mb()
+        store = FaissStore(tmp) if name == "faiss" else ChromaStore(os.path.join(tmp, "chroma"), host=None)
+
+        start = time.perf_counter()
+        store.replace(embeddings, records)
+        ingest_s = time.perf_counter() - start
+        ingest_rss = rss_mb()
+
+        for q in queries[:20]:
+            store.search(q[None, :], args.k)
+        plain, recall = [], []
+        for q in queries:
+            start = time.perf_counter()
+            hits = store.search(q[None, :], args.k)
+            plain.append(time.perf_counter() - start)
+            exact = np.argsort(((embeddings - q) ** 2).sum(axis=1))[:args.k]
+            expected = {records[i]["video_id"] for i in exact}
+            recall.append(len(expected & {rec["video_id"] for _, rec in hits}) / args.k)
+
+        filtered = []
+        for q, channel in zip(queries, channels):
+            start = time.perf_counter()
+            store.search(q[None, :], args.k, {"channel_title": channel})
+            filtered.append(time.perf_counter() - start)
+
+        changed = min(1000, args.rows)
+        start = time.perf_counter()
+        store.upsert(embeddings[:changed] + 0.01, records[:changed])
+        upsert_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store.delete([rec["video_id"] for rec in records[:changed]])
+        delete_s = time.perf_counter() - start
+        count = store.count()
+        store.close()
+
+    results[name] = {
+        "ingest_rows_per_s": round(args.rows / ingest_s, 1),
+        "rss_mb": round(ingest_rss - base_rss, 1),
+        "search_ms_p50_p99": percentiles(plain),
+        "filtered_ms_p50_p99": percentiles(filtered),
+        f"recall@{args.k}": round(float(np.mean(recall)), 4),
+        f"upsert_{changed}_s": round(upsert_s, 3),
+        f"delete_{changed}_s": round(delete_s, 3),
+        "count_after_delete": count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--backends", nargs="+", default=sorted(BACKENDS), choices=sorted(BACKENDS))
+    args = parser.parse_args()
+
+    # One fresh process per backend, so resident memory is not shared between them
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Manager() as manager:
+        results = manager.dict()
+        for name in args.backends:
+            proc = ctx.Process(target=run_backend, args=(name, args, results))
+            proc.start()
+            proc.join()
+            if proc.exitcode != 0:
+                print(f"{name:<8} failed (exit code {proc.exitcode})")
+                continue
+            print(f"{name:<8} " + " ".join(f"{key}={value}" for key, value in results[name].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+bench_encoder.py
+- Microbenchmark for query encoding cost:
+  python bench_encoder.py --queries 2000
+- Compares, per query:
+  1. sklearn: svd.transform(tfidf.transform([q])) from the pickles (skipped if sklearn is missing)
+  2. reference: QueryEncoder.transform_reference (normalise TF-IDF, then project)
+  3. table: QueryEncoder.transform (weighted sum of term_proj rows)
+- Reports microseconds per query and the max abs difference against the first available baseline.
+"""
+
+import argparse
+import pickle
+import time
+
+import numpy as np
+
+from encoder import ENCODER_DIR, QueryEncoder
+
+
+def make_queries(encoder, n, seed=42):
+    """3-5 word queries drawn from the vocabulary, with an occasional unknown word."""
+    rng = np.random.default_rng(seed)
+    vocab = encoder.vocab
+    queries = []
+    for _ in range(n):
+        words = [str(vocab[i]) for i in rng.integers(0, len(vocab), rng.integers(3, 6))]
+        if rng.random() < 0.3:
+            words.append("qwertyuiop")
+        queries.append(" ".join(words))
+    return queries
+
+
+def time_per_query(fn, queries):
+    for q in queries[:50]:
+        fn([q])
+    start = time.perf_counter()
+    out = np.vstack([fn([q]) for q in queries])
+    return (time.perf_counter() - start) / len(queries) * 1e6, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--encoder-dir", default=ENCODER_DIR)
+    parser.add_argument("--tfidf", default="models/tfidf.pkl")
+    parser.add_argument("--svd", default="models/svd.pkl")
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    encoder = QueryEncoder(args.encoder_dir)
+    queries = make_queries(encoder, args.queries)
+
+    paths = {}
+    try:
+        with open(args.tfidf, "rb") as f:
+            tfidf = pickle.load(f)
+        with open(args.svd, "rb") as f:
+            svd = pickle.load(f)
+        paths["sklearn"] = lambda qs: svd.transform(tfidf.transform(qs))
+    except (ImportError, FileNotFoundError) as e:
+        print(f"Skipping sklearn baseline: {e}")
+    paths["reference"] = encoder.transform_reference
+    paths["table"] = encoder.transform
+
+    baseline = None
+    print(f"{'path':<10} {'us/query':>10} {'max abs diff':>14}")
+    for name, fn in paths.items():
+        us, out = time_per_query(fn, queries)
+        if baseline is None:
+            baseline = out
+        print(f"{name:<10} {us:>10.1f} {np.abs(out - baseline).max():>14.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+bench_suggest.py
+- Latency benchmark for the /suggest prefix index:
+  python bench_suggest.py                     # index in models/suggest
+  python bench_suggest.py --synthetic 200000  # build a throwaway index from random titles
+- Draws prefixes of 1-8 characters from indexed keys (plus some misses) and reports
+  p50 / p99 / max lookup time in microseconds, for hot (precomputed) and scanned prefixes.
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from suggest import SUGGEST_DIR, SuggestIndex, build_suggest_index
+
+WORDS = ["ai", "art", "brain", "change", "climate", "data", "design", "education", "future", "happiness",
+         "health", "history", "how", "learning", "life", "love", "music", "power", "science", "secret",
+         "space", "story", "technology", "the", "why", "work", "world", "your"]
+
+
+def synthetic_records(n, seed=42):
+    rng = np.random.default_rng(seed)
+    return [{
+        "video_id": f"vid_{i}",
+        "title": " ".join(rng.choice(WORDS, rng.integers(3, 9))) + f" {i}",
+        "channel_title": f"Channel {rng.integers(0, n // 50 + 1)}",
+        "view_count": int(rng.pareto(1.2) * 1000),
+    } for i in range(n)]
+
+
+def run(index, queries, n):
+    for q in queries[:100]:
+        index.top_ids(q, n)
+    hot_times, scan_times = [], []
+    for q in queries:
+        start = time.perf_counter()
+        index.top_ids(q, n)
+        elapsed = (time.perf_counter() - start) * 1e6
+        pos = int(np.searchsorted(index.hot_prefixes, q))
+        is_hot = pos < len(index.hot_prefixes) and index.hot_prefixes[pos] == q
+        (hot_times if is_hot else scan_times).append(elapsed)
+    return hot_times, scan_times
+
+
+def report(name, times):
+    if not times:
+        print(f"{name:<8} no queries")
+        return
+    times = np.array(times)
+    print(f"{name:<8} n={len(times):<7} p50={np.percentile(times, 50):7.1f}us "
+          f"p99={np.percentile(times, 99):7.1f}us max={times.max():7.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=SUGGEST_DIR)
+    parser.add_argument("--synthetic", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--n", type=int, default=10)
+    args = parser.parse_args()
+
+    tmp = None
+    root = args.root
+    if args.synthetic:
+        tmp = tempfile.TemporaryDirectory()
+        root = tmp.name
+        start = time.perf_counter()
+        stats = build_suggest_index(synthetic_records(args.synthetic), root)
+        print(f"Built {stats} in {time.perf_counter() - start:.1f}s")
+
+    index = SuggestIndex(root)
+    rng = np.random.default_rng(0)
+    keys = index.keys
+    queries = []
+    for _ in range(args.queries):
+        key = str(keys[rng.integers(0, len(keys))])
+        queries.append(key[:rng.integers(1, 9)])
+    queries += ["zzqx", "qqq"] * (args.queries // 100)
+
+    hot_times, scan_times = run(index, queries, args.n)
+    report("hot", hot_times)
+    report("scanned", scan_times)
+    report("all", hot_times + scan_times)
+
+    if tmp is not None:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+dedup.py
+- Near-duplicate detection for ingest with MinHash + LSH banding over transcripts
+  (cleaned_transcript, falling back to transcript).
+- Each document becomes a set of word 5-gram shingles hashed with crc32; NUM_PERM universal
+  hashes turn it into a MinHash signature whose agreement rate estimates Jaccard similarity.
+- Signatures are cut into BANDS bands; documents sharing a band bucket are candidates and are
+  merged (union-find) when their estimated similarity is >= THRESHOLD. Each bucket member is
+  only compared with the bucket's first member, so the work stays linear in the corpus.
+- One canonical row per cluster (most viewed, else first seen) is indexed; the other
+  video_ids are kept on its metadata as `duplicate_ids`.
+- The signatures of indexed rows are stored with the snapshot (minhash.npy), so an upsert can
+  match new rows against what is already indexed (match_signatures) with the same banding.
+"""
+
+import re
+import zlib
+
+import numpy as np
+import pandas as pd
+
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+BANDS = 16
+THRESHOLD = 0.8
+CHUNK_SIZE = 2000
+TEXT_COLUMNS = ["cleaned_transcript", "transcript"]
+VIEW_COLUMNS = ["viewCount", "view_count"]
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_TOKEN_RE = re.compile(r"\w+")
+
+_rng = np.random.default_rng(1)
+_PERM_A = _rng.integers(1, _MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _MERSENNE_PRIME, size=NUM_PERM, dtype=np.uint64)
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """crc32 hashes of the word n-grams of `text` (whole token list if it is shorter)."""
+    tokens = _TOKEN_RE.findall(str(text).lower())
+    if len(tokens) >= size:
+        tokens = [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+    hashes = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in tokens), dtype=np.uint64, count=len(tokens))
+    return np.unique(hashes)
+
+
+def minhash(text):
+    """MinHash signature of `text`, or None when it has no tokens (never deduplicated)."""
+    hv = shingles(text)
+    if not len(hv):
+        return None
+    # uint64 products wrap around, as in the usual Mersenne-prime MinHash implementations
+    permuted = ((_PERM_A[:, None] * hv[None, :] + _PERM_B[:, None]) % _MERSENNE_PRIME) & _MAX_HASH
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def find_clusters(signatures, bands=BANDS, threshold=THRESHOLD):
+    """Cluster root for every row; rows without a signature are their own cluster."""
+    parent = list(range(len(signatures)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rows = NUM_PERM // bands
+    for band in range(bands):
+        buckets = {}
+        for i, sig in enumerate(signatures):
+            if sig is None:
+                continue
+            head = buckets.setdefault(sig[band * rows:(band + 1) * rows].tobytes(), i)
+            if head == i:
+                continue
+            root_head, root_i = find(head), find(i)
+            if root_head != root_i and np.mean(signatures[head] == sig) >= threshold:
+                parent[root_i] = root_head
+    return [find(i) for i in range(len(signatures))]
+
+
+def signature_matrix(signatures):
+    """Stack signatures into a (rows, NUM_PERM) uint32 array; rows without one are all zeros."""
+    matrix = np.zeros((len(signatures), NUM_PERM), dtype=np.uint32)
+    for i, sig in enumerate(signatures):
+        if sig is not None:
+            matrix[i] = sig
+    return matrix
+
+
+def match_signatures(stored, signatures, bands=BANDS, threshold=THRESHOLD):
+    """
+    For every row of the `signatures` matrix, a row of the `stored` matrix it is a near-duplicate
+    of, or -1. All-zero rows (no signature) never match. Like find_clusters, each row is only
+    compared with the first stored row of its band bucket.
+    """
+    rows = NUM_PERM // bands
+    matches = np.full(len(signatures), -1, dtype=np.int64)
+    valid = np.flatnonzero(np.asarray(stored).any(axis=1))
+    for band in range(bands):
+        cols = slice(band * rows, (band + 1) * rows)
+        buckets = {}
+        for i in valid:
+            buckets.setdefault(stored[i, cols].tobytes(), i)
+        for j, sig in enumerate(signatures):
+            if matches[j] >= 0 or not sig.any():
+                continue
+            head = buckets.get(sig[cols].tobytes())
+            if head is not None and np.mean(stored[head] == sig) >= threshold:
+                matches[j] = head
+    return matches
+
+
+def text_column(csv_path):
+    columns = pd.read_csv(csv_path, nrows=0).columns
+    return next((c for c in TEXT_COLUMNS if c in columns), None)
+
+
+def dedupe_csv(csv_path, df, progress, chunk_size=CHUNK_SIZE):
+    """
+    Stream transcripts from `csv_path` (rows aligned with `df`) and cluster near-duplicates.
+    Returns (keep mask, alternate video_ids per row, report, signature matrix); report and
+    signatures are None if there is no transcript column to compare.
+    """
+    column = text_column(csv_path)
+    if column is None:
+        return np.ones(len(df), dtype=bool), [[] for _ in range(len(df))], None, None
+
+    signatures = []
+    for chunk in pd.read_csv(csv_path, usecols=[column], chunksize=chunk_size):
+        signatures.extend(minhash(text) for text in chunk[column].fillna(""))
+        progress("dedup", len(signatures), len(df), "docs")
+
+    progress("dedup clustering")
+    roots = find_clusters(signatures)
+    clusters = {}
+    for i, root in enumerate(roots):
+        clusters.setdefault(root, []).append(i)
+
+    view_column = next((c for c in VIEW_COLUMNS if c in df.columns), None)
+    views = (pd.to_numeric(df[view_column], errors="coerce").fillna(-1).to_numpy()
+             if view_column else np.zeros(len(df)))
+    video_ids = df["video_id"].astype(str).tolist()
+
+    keep = np.zeros(len(df), dtype=bool)
+    alternates = [[] for _ in range(len(df))]
+    for members in clusters.values():
+        canonical = max(members, key=lambda i: (views[i], -i))
+        keep[canonical] = True
+        alternates[canonical] = [video_ids[i] for i in members if i != canonical]
+
+    removed = int(len(df) - keep.sum())
+    report = {
+        "column": column,
+        "rows_in": len(df),
+        "rows_out": int(keep.sum()),
+        "rows_removed": removed,
+        "duplicate_clusters": sum(1 for members in clusters.values() if len(members) > 1),
+        "reduction_pct": round(100.0 * removed / len(df), 2) if len(df) else 0.0,
+    }
+    return keep, alternates, report, signature_matrix(signatures)
@@ -0,0 +1,176 @@
+"""
+encoder.py
+- Pickle-free export of the TF-IDF + SVD query encoder.
+- export_encoder() writes the fitted sklearn models as plain files:
+    vocab.npy       sorted vocabulary (fixed-width unicode array)
+    idf.npy         IDF weight per vocabulary term
+    components.npy  svd.components_ with columns in vocabulary order
+    term_proj.npy   per-term dense rows, idf[j] * components[:, j]
+    config.json     analyser settings (lowercase, token pattern, stop words, n-grams, norm)
+- QueryEncoder memory-maps those files and reproduces
+  svd.transform(tfidf.transform(texts)) without importing sklearn. A query embedding is
+  a weighted sum of a few term_proj rows (looked up in a dict), divided by the TF-IDF norm,
+  which is algebraically the same as normalising first and projecting afterwards.
+- CLI: python encoder.py [tfidf.pkl svd.pkl out_dir] converts existing pickles and checks the output.
+"""
+
+import json
+import os
+import re
+import sys
+from collections import Counter
+
+import numpy as np
+
+from mmap_store import atomic_write
+
+ENCODER_DIR = "models/encoder"
+ENCODER_FILES = ["config.json", "vocab.npy", "idf.npy", "components.npy"]
+
+
+def encoder_exists(root=ENCODER_DIR):
+    return all(os.path.exists(os.path.join(root, name)) for name in ENCODER_FILES)
+
+
+def export_encoder(tfidf, svd, root=ENCODER_DIR):
+    """Write a fitted TfidfVectorizer + TruncatedSVD as mmap-able arrays plus a JSON config."""
+    params = tfidf.get_params()
+    unsupported = {
+        "analyzer": params["analyzer"] != "word",
+        "strip_accents": params["strip_accents"] is not None,
+        "preprocessor": params["preprocessor"] is not None,
+        "tokenizer": params["tokenizer"] is not None,
+        "binary": params["binary"],
+        "use_idf": not params["use_idf"],
+        "norm": params["norm"] not in ("l2", None),
+    }
+    bad = [name for name, flag in unsupported.items() if flag]
+    if bad:
+        raise ValueError(f"Cannot export TfidfVectorizer with custom settings: {bad}")
+
+    terms = np.asarray(tfidf.get_feature_names_out(), dtype=str)
+    order = np.argsort(terms, kind="stable")
+    stop_words = tfidf.get_stop_words()
+    config = {
+        "lowercase": params["lowercase"],
+        "token_pattern": params["token_pattern"],
+        "stop_words": sorted(stop_words) if stop_words else [],
+        "ngram_range": list(params["ngram_range"]),
+        "norm": params["norm"],
+        "sublinear_tf": params["sublinear_tf"],
+        "n_components": int(svd.components_.shape[0]),
+    }
+
+    os.makedirs(root, exist_ok=True)
+    idf = np.asarray(tfidf.idf_, dtype="float64")[order]
+    components = np.ascontiguousarray(svd.components_[:, order], dtype="float64")
+    arrays = {
+        "vocab.npy": terms[order],
+        "idf.npy": idf,
+        "components.npy": components,
+        "term_proj.npy": build_term_projection(idf, components),
+    }
+    for name, arr in arrays.items():
+        atomic_write(os.path.join(root, name), lambda f: np.save(f, arr))
+    # config.json last: readers treat it as the "export complete" marker
+    atomic_write(os.path.join(root, "config.json"), lambda f: json.dump(config, f), mode="w")
+
+
+def build_term_projection(idf, components):
+    """(n_terms, n_components) table whose row j is the SVD image of term j at unit TF."""
+    return np.ascontiguousarray((components * idf).T, dtype="float64")
+
+
+class QueryEncoder:
+    """sklearn-free equivalent of svd.transform(tfidf.transform(texts))."""
+
+    def __init__(self, root=ENCODER_DIR):
+        with open(os.path.join(root, "config.json"), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.vocab = np.load(os.path.join(root, "vocab.npy"), mmap_mode="r")
+        self.idf = np.load(os.path.join(root, "idf.npy"), mmap_mode="r")
+        self.components = np.load(os.path.join(root, "components.npy"), mmap_mode="r")
+        proj_path = os.path.join(root, "term_proj.npy")
+        if os.path.exists(proj_path):
+            self.term_proj = np.load(proj_path, mmap_mode="r")
+        else:
+            # Exported before the projection table existed
+            self.term_proj = build_term_projection(self.idf, self.components)
+        self.term_index = {term: i for i, term in enumerate(self.vocab.tolist())}
+        self.token_re = re.compile(self.config["token_pattern"])
+        self.stop_words = frozenset(self.config["stop_words"])
+        self.min_n, self.max_n = self.config["ngram_range"]
+
+    def analyze(self, text):
+        """Same tokens as TfidfVectorizer.build_analyzer() for the exported settings."""
+        if self.config["lowercase"]:
+            text = text.lower()
+        tokens = [t for t in self.token_re.findall(text) if t not in self.stop_words]
+        if self.max_n == 1:
+            return tokens
+        terms = list(tokens) if self.min_n == 1 else []
+        for n in range(max(self.min_n, 2), self.max_n + 1):
+            terms.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return terms
+
+    def term_counts(self, text):
+        """Vocabulary columns and term frequencies for `text`; unknown terms are dropped."""
+        counts = Counter(self.analyze(text))
+        cols, tf = [], []
+        for term, count in counts.items():
+            col = self.term_index.get(term)
+            if col is not None:
+                cols.append(col)
+                tf.append(count)
+        tf = np.array(tf, dtype="float64")
+        if self.config["sublinear_tf"]:
+            tf = np.log(tf) + 1
+        return cols, tf
+
+    def transform(self, texts):
+        out = np.zeros((len(texts), self.term_proj.shape[1]), dtype="float64")
+        for row, text in enumerate(texts):
+            cols, tf = self.term_counts(text)
+            if not cols:
+                continue
+            out[row] = tf @ self.term_proj[cols]
+            if self.config["norm"] == "l2":
+                weights = tf * self.idf[cols]
+                out[row] /= np.sqrt(np.dot(weights, weights))
+        return out
+
+    def transform_reference(self, texts):
+        """Normalise the sparse TF-IDF vector, then project (the sklearn order of operations)."""
+        out = np.zeros((len(texts), self.components.shape[0]), dtype="float64")
+        for row, text in enumerate(texts):
+            cols, tf = self.term_counts(text)
+            if not cols:
+                continue
+            weights = tf * self.idf[cols]
+            if self.config["norm"] == "l2":
+                weights /= np.sqrt(np.dot(weights, weights))
+            out[row] = self.components[:, cols] @ weights
+        return out
+
+
+def main():
+    """Convert existing tfidf.pkl/svd.pkl to the pickle-free format and verify it."""
+    import pickle
+
+    tfidf_path, svd_path, root = (sys.argv[1:4] if len(sys.argv) >= 4
+                                  else ("models/tfidf.pkl", "models/svd.pkl", ENCODER_DIR))
+    with open(tfidf_path, "rb") as f:
+        tfidf = pickle.load(f)
+    with open(svd_path, "rb") as f:
+        svd = pickle.load(f)
+    export_encoder(tfidf, svd, root)
+    print(f"✓ Exported encoder to {root}")
+
+    samples = ["artificial intelligence", "How to learn faster", "climate change and the ocean", "zzzz"]
+    expected = svd.transform(tfidf.transform(samples))
+    got = QueryEncoder(root).transform(samples)
+    print(f"✓ Max abs difference vs sklearn on {len(samples)} queries: {np.abs(expected - got).max():.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+jobs.py
+- Background ingest jobs. The upload is spooled to disk, the build runs in its own process
+  and the API only touches small JSON status files, so /search keeps serving the current
+  index while a build runs.
+- Status lives in models/jobs/<job_id>.json and is visible to every uvicorn worker.
+- One build at a time: the submitting worker takes an exclusive flock on models/jobs/build.lock
+  (which also names the job) and hands the locked file to the build process, which holds it
+  for its whole life. The kernel drops the lock when that process exits, however it dies, so
+  "job alive" is simply "lock held by this job" - no pid checks, nothing to clean up. POSIX only.
+- Cancellation is cooperative: cancel_job() drops a <job_id>.cancel flag and the build stops
+  at its next progress checkpoint.
+"""
+
+import fcntl
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import time
+import traceback
+import uuid
+
+from mmap_store import atomic_write
+
+JOBS_DIR = "models/jobs"
+LOCK_PATH = os.path.join(JOBS_DIR, "build.lock")
+STATUS_INTERVAL = 0.5  # seconds between progress writes
+JOB_NICENESS = int(os.getenv("JOB_NICENESS", "10"))
+FINAL_STATES = {"succeeded", "failed", "cancelled"}
+LOCK_WAIT = 5.0  # seconds a new build waits for a finished one to exit
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobBusy(Exception):
+    def __init__(self, job_id):
+        super().__init__(f"Another ingest job is already running: {job_id}")
+        self.job_id = job_id
+
+
+def status_path(job_id):
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+
+def spool_path(job_id):
+    return os.path.join(JOBS_DIR, f"{job_id}.csv")
+
+
+def cancel_path(job_id):
+    return os.path.join(JOBS_DIR, f"{job_id}.cancel")
+
+
+def write_status(status):
+    atomic_write(status_path(status["job_id"]), lambda f: json.dump(status, f), mode="w")
+
+
+def _load_status(job_id):
+    with open(status_path(job_id), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _open_lock():
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    return os.open(LOCK_PATH, os.O_RDWR | os.O_CREAT)
+
+
+def _lock_holder():
+    try:
+        with open(LOCK_PATH, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _finished(job_id):
+    try:
+        return _load_status(job_id)["state"] in FINAL_STATES
+    except (FileNotFoundError, TypeError, ValueError):
+        return False
+
+
+def acquire_lock(job_id):
+    """Take the build lock for `job_id` and return its fd; raises JobBusy if a build holds it."""
+    fd = _open_lock()
+    deadline = time.monotonic() + LOCK_WAIT
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except BlockingIOError:
+            # Held by a status probe (microseconds) or by a build that already wrote its final
+            # state and is exiting: wait for it. A running build keeps it, so give up at once.
+            holder = _lock_holder()
+            if not _finished(holder) or time.monotonic() >= deadline:
+                os.close(fd)
+                raise JobBusy(holder)
+            time.sleep(0.05)
+    os.ftruncate(fd, 0)
+    os.write(fd, job_id.encode("utf-8"))
+    return fd
+
+
+def build_alive(job_id):
+    """True while the lock is held on behalf of `job_id` (by its submitter, then its build process)."""
+    fd = _open_lock()
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return _lock_holder() == job_id
+        return False
+    finally:
+        # Closing drops the probe's shared lock
+        os.close(fd)
+
+
+def read_status(job_id):
+    """Current status of a job, or None if unknown. Jobs whose process died are marked failed."""
+    if not re.fullmatch(r"[0-9a-f]{32}", job_id) or not os.path.exists(status_path(job_id)):
+        return None
+    status = _load_status(job_id)
+    if status["state"] not in FINAL_STATES and not build_alive(job_id):
+        # The build writes its final state before it exits and releases the lock
+        status = _load_status(job_id)
+        if status["state"] not in FINAL_STATES:
+            status.update(state="failed", error="Build process exited unexpectedly", finished_at=time.time())
+            write_status(status)
+            _remove_job_files(job_id)
+    return status
+
+
+def _remove_job_files(job_id):
+    for path in [spool_path(job_id), cancel_path(job_id)]:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class _LockHandle:
+    """Passes the locked build.lock fd to the spawned build process (same open file, same lock)."""
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    def __reduce__(self):
+        from multiprocessing.reduction import DupFd
+        return _rebuild_lock_fd, (DupFd(self.fd),)
+
+
+def _rebuild_lock_fd(dup):
+    return dup.detach()
+
+
+class JobProgress:
+    """
+    Handed to the build as `progress(stage, done=None, total=None, unit="rows")`.
+    Tracks throughput and ETA per stage, persists them at most every STATUS_INTERVAL seconds
+    and raises JobCancelled once a cancel was requested.
+    """
+
+    def __init__(self, status):
+        self.status = status
+        self.stage_started = time.monotonic()
+        self.last_write = 0.0
+
+    def __call__(self, stage, done=None, total=None, unit="rows"):
+        if os.path.exists(cancel_path(self.status["job_id"])):
+            raise JobCancelled()
+
+        now = time.monotonic()
+        new_stage = stage != self.status["stage"]
+        if new_stage:
+            self.stage_started = now
+        elapsed = now - self.stage_started
+        throughput = done / elapsed if done and elapsed > 0 else None
+        eta = (total - done) / throughput if throughput and total is not None else None
+
+        self.status.update(
+            stage=stage,
+            done=done,
+            total=total,
+            unit=unit,
+            throughput=round(throughput, 1) if throughput else None,
+            eta_seconds=round(eta, 1) if eta is not None else None,
+        )
+        if new_stage or now - self.last_write >= STATUS_INTERVAL:
+            write_status(self.status)
+            self.last_write = now
+
+    def finish(self, state, **fields):
+        self.status.update(state=state, finished_at=time.time(), eta_seconds=None, **fields)
+        write_status(self.status)
+
+
+def _job_main(job_id, target, options, lock_fd):
+    """Entry point of the build process. `lock_fd` keeps the build lock until this process exits."""
+    if JOB_NICENESS and hasattr(os, "nice"):
+        # Keep the API workers ahead of the build in the CPU scheduler
+        os.nice(JOB_NICENESS)
+
+    status = _load_status(job_id)
+    status.update(state="running", pid=os.getpid(), started_at=time.time())
+    write_status(status)
+    progress = JobProgress(status)
+    try:
+        result = target(spool_path(job_id), options, progress)
+        progress.finish("succeeded", result=result)
+    except JobCancelled:
+        progress.finish("cancelled")
+    except Exception as e:
+        traceback.print_exc()
+        progress.finish("failed", error=str(e))
+    finally:
+        _remove_job_files(job_id)
+
+
+def submit_job(fileobj, target, options):
+    """
+    Spool `fileobj` and run `target(csv_path, options, progress)` in a new process.
+    Raises JobBusy if another build holds the lock. Returns the initial status.
+    """
+    job_id = uuid.uuid4().hex
+    lock_fd = acquire_lock(job_id)
+    status = {
+        "job_id": job_id,
+        "state": "queued",
+        "stage": "uploading",
+        "done": None,
+        "total": None,
+        "unit": None,
+        "throughput": None,
+        "eta_seconds": None,
+        "options": options,
+        "pid": os.getpid(),
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "result": None,
+        "error": None,
+    }
+    try:
+        write_status(status)
+        with open(spool_path(job_id), "wb") as f:
+            shutil.copyfileobj(fileobj, f, length=1024 * 1024)
+        # spawn: a clean interpreter, no forked copies of the API worker's threads or mmaps
+        ctx = multiprocessing.get_context("spawn")
+        ctx.Process(target=_job_main, args=(job_id, target, options, _LockHandle(lock_fd)),
+                    name=f"ingest-{job_id}").start()
+    except Exception as e:
+        status.update(state="failed", error=str(e), finished_at=time.time())
+        write_status(status)
+        _remove_job_files(job_id)
+        raise
+    finally:
+        # The build process has its own reference to the locked file from here on
+        os.close(lock_fd)
+    return status
+
+
+def cancel_job(job_id):
+    """Request cancellation; returns the job status (unchanged if it already finished) or None."""
+    status = read_status(job_id)
+    if status is None or status["state"] in FINAL_STATES:
+        return status
+    with open(cancel_path(job_id), "w", encoding="utf-8"):
+        pass
+    return status
+
+
+def reap_finished():
+    """Join exited build processes started by this worker (avoids zombies; liveness does not depend on it)."""
+    multiprocessing.active_children()
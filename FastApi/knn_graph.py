@@ -0,0 +1,158 @@
+"""
+knn_graph.py
+- Precomputed k-nearest-neighbour graph over all indexed vectors, for /similar/{video_id}.
+- Built at ingest with a blocked all-pairs search: query blocks of BLOCK_SIZE rows are searched
+  against the whole matrix with faiss.knn on a thread pool (faiss releases the GIL; each pool
+  thread runs faiss single-threaded to avoid oversubscription).
+- Stored as CSR arrays (indptr / neighbour rows / distances) plus a sorted video_id array for
+  binary-search lookup, all memory-mapped at serving time, so a lookup is O(log n + k).
+  Near-duplicate ids removed at ingest are in the lookup too, pointing at their canonical row.
+- update_knn_graph() refreshes the graph after an upsert without a full rebuild: untouched rows
+  merge their current list with their nearest new/changed rows, and only new rows, changed rows
+  and rows that had a changed row as neighbour are searched against everything again.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+import numpy as np
+
+from mmap_store import atomic_write
+
+KNN_K = 10
+BLOCK_SIZE = 1024
+N_THREADS = os.cpu_count() or 1
+GRAPH_FILES = ["knn_indptr.npy", "knn_indices.npy", "knn_distances.npy", "knn_ids.npy", "knn_id_rows.npy"]
+
+
+def _no_progress(stage, done=None, total=None, unit="rows"):
+    pass
+
+
+def search_blocks(queries, base, k, progress=_no_progress, stage="knn graph"):
+    """Exact kNN of every query row in `base`, in blocks spread over a thread pool."""
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    base = np.ascontiguousarray(base, dtype="float32")
+    k = min(k, len(base))
+    distances = np.empty((len(queries), k), dtype="float32")
+    indices = np.empty((len(queries), k), dtype="int64")
+
+    def run(start):
+        end = min(start + BLOCK_SIZE, len(queries))
+        distances[start:end], indices[start:end] = faiss.knn(queries[start:end], base, k)
+        return end - start
+
+    starts = range(0, len(queries), BLOCK_SIZE)
+    with ThreadPoolExecutor(max_workers=N_THREADS, initializer=faiss.omp_set_num_threads, initargs=(1,)) as pool:
+        done = 0
+        for count in pool.map(run, starts):
+            done += count
+            progress(stage, done, len(queries))
+    return distances, indices
+
+
+def _drop_self(rows, distances, indices, k):
+    """Remove each query row from its own result list (it is not always first with duplicates)."""
+    out = []
+    for r, row_d, row_i in zip(rows, distances, indices):
+        pairs = [(float(d), int(i)) for d, i in zip(row_d, row_i) if i != r and i >= 0]
+        out.append(pairs[:k])
+    return out
+
+
+def _to_csr(lists):
+    indptr = np.zeros(len(lists) + 1, dtype="int64")
+    indptr[1:] = np.cumsum([len(pairs) for pairs in lists])
+    indices = np.array([i for pairs in lists for _, i in pairs], dtype="int32")
+    distances = np.array([d for pairs in lists for d, _ in pairs], dtype="float32")
+    return indptr, indices, distances
+
+
+def build_knn_graph(embeddings, k=KNN_K, progress=_no_progress):
+    rows = range(len(embeddings))
+    distances, indices = search_blocks(embeddings, embeddings, k + 1, progress)
+    return _to_csr(_drop_self(rows, distances, indices, k))
+
+
+def update_knn_graph(graph, embeddings, changed_rows, new_start, k=KNN_K, progress=_no_progress):
+    """
+    Refresh `graph` (indptr, indices, distances over the first `new_start` rows) for an upsert:
+    rows >= new_start were appended and `changed_rows` had their vectors replaced.
+    """
+    indptr, indices, distances = graph
+    n = len(embeddings)
+    fresh = sorted(set(changed_rows) | set(range(new_start, n)))
+    changed = set(changed_rows)
+    old_rows = [r for r in range(new_start) if r not in changed]
+
+    lists = [None] * n
+    recompute = set(fresh)
+    if fresh and old_rows:
+        fresh_d, fresh_i = search_blocks(embeddings[old_rows], embeddings[fresh], k, progress, "knn graph merge")
+        for j, r in enumerate(old_rows):
+            nbrs = indices[indptr[r]:indptr[r + 1]]
+            if changed.intersection(nbrs.tolist()):
+                # A neighbour moved; its replacement may be further than the old (k+1)-th row
+                recompute.add(r)
+                continue
+            current = list(zip(distances[indptr[r]:indptr[r + 1]].tolist(), nbrs.tolist()))
+            candidates = [(float(d), fresh[int(i)]) for d, i in zip(fresh_d[j], fresh_i[j]) if i >= 0]
+            lists[r] = sorted(current + candidates)[:k]
+    else:
+        for r in old_rows:
+            lists[r] = list(zip(distances[indptr[r]:indptr[r + 1]].tolist(), indices[indptr[r]:indptr[r + 1]].tolist()))
+
+    recompute = sorted(recompute)
+    if recompute:
+        d, i = search_blocks(embeddings[recompute], embeddings, k + 1, progress)
+        for r, pairs in zip(recompute, _drop_self(recompute, d, i, k)):
+            lists[r] = pairs
+    return _to_csr(lists)
+
+
+def save_knn_graph(root, graph, video_ids, aliases=()):
+    """`aliases` are extra (video_id, row) pairs, e.g. duplicate ids resolving to their canonical row."""
+    indptr, indices, distances = graph
+    aliases = list(aliases)
+    ids = np.asarray([str(v) for v in video_ids] + [str(v) for v, _ in aliases], dtype=str)
+    rows = np.concatenate([np.arange(len(video_ids)), [row for _, row in aliases]]).astype("int64")
+    # Stable sort: an indexed video_id comes before an alias with the same id
+    order = np.argsort(ids, kind="stable")
+    arrays = {
+        "knn_indptr.npy": indptr,
+        "knn_indices.npy": indices,
+        "knn_distances.npy": distances,
+        "knn_ids.npy": ids[order],
+        "knn_id_rows.npy": rows[order],
+    }
+    for name, arr in arrays.items():
+        atomic_write(os.path.join(root, name), lambda f: np.save(f, arr))
+
+
+def load_graph_arrays(root):
+    return tuple(np.load(os.path.join(root, name)) for name in GRAPH_FILES[:3])
+
+
+def graph_exists(root):
+    return all(os.path.exists(os.path.join(root, name)) for name in GRAPH_FILES)
+
+
+class KnnGraph:
+    """Memory-mapped CSR neighbour lists with video_id -> row lookup."""
+
+    def __init__(self, root):
+        self.indptr, self.indices, self.distances, self.ids, self.id_rows = (
+            np.load(os.path.join(root, name), mmap_mode="r") for name in GRAPH_FILES
+        )
+
+    def row_of(self, video_id):
+        pos = int(np.searchsorted(self.ids, video_id))
+        if pos < len(self.ids) and self.ids[pos] == video_id:
+            return int(self.id_rows[pos])
+        return None
+
+    def neighbors(self, row, k=KNN_K):
+        start, end = int(self.indptr[row]), int(self.indptr[row + 1])
+        end = min(end, start + k)
+        return self.indices[start:end], self.distances[start:end]
@@ -0,0 +1,129 @@
+"""
+mmap_store.py
+- Read-only, memory-mapped storage for the vector index and its metadata.
+- Vectors are kept as a raw float32 .npy so every uvicorn worker maps the same file
+  and shares the physical pages through the OS page cache instead of holding a copy.
+- Metadata records are stored as one UTF-8 JSON blob plus an offsets array, so a worker
+  only decodes the rows it actually returns.
+- Field indexes (e.g. channel_title -> rows) are sorted key / row arrays, so an equality
+  filter finds its rows with one binary search and is searched as a subset.
+- Files are written to a temp name and swapped in with os.replace(), so workers that still
+  have the old files mapped keep reading a consistent snapshot.
+"""
+
+import json
+import os
+
+import faiss
+import numpy as np
+
+
+def atomic_write(path, write_fn, mode="wb"):
+    """Write `path` through a temp file and rename it into place."""
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    try:
+        with open(tmp_path, mode) as f:
+            write_fn(f)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def save_vectors(path, embeddings):
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    atomic_write(path, lambda f: np.save(f, embeddings))
+
+
+def save_metadata(blob_path, offsets_path, records):
+    encoded = [json.dumps(r, ensure_ascii=False, default=str).encode("utf-8") for r in records]
+    offsets = np.zeros(len(encoded) + 1, dtype="int64")
+    if encoded:
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+    atomic_write(blob_path, lambda f: f.write(b"".join(encoded)))
+    atomic_write(offsets_path, lambda f: np.save(f, offsets))
+
+
+def field_index_paths(root, field):
+    return [os.path.join(root, f"{field}_{name}.npy") for name in ["keys", "indptr", "rows"]]
+
+
+def field_index_exists(root, field):
+    return all(os.path.exists(p) for p in field_index_paths(root, field))
+
+
+def save_field_index(root, records, field):
+    """Rows grouped by the string value of `field`; rows stay ascending within a value."""
+    values = [rec.get(field) for rec in records]
+    rows = np.array([i for i, v in enumerate(values) if isinstance(v, str)], dtype="int64")
+    keys = np.asarray([values[i] for i in rows], dtype=str)
+    order = np.argsort(keys, kind="stable")
+    keys, rows = keys[order], rows[order]
+    uniq, starts = np.unique(keys, return_index=True)
+    indptr = np.append(starts, len(keys)).astype("int64")
+    for path, arr in zip(field_index_paths(root, field), [uniq, indptr, rows]):
+        atomic_write(path, lambda f: np.save(f, arr))
+
+
+class MmapIndex:
+    """Exact L2 search over a memory-mapped float32 matrix (same results as IndexFlatL2)."""
+
+    def __init__(self, vectors_path):
+        self.xb = np.load(vectors_path, mmap_mode="r")
+        self.ntotal, self.d = self.xb.shape
+
+    def search(self, xq, k, rows=None):
+        """Top-k over all rows, or only over `rows` (sorted row ids; returned ids are still global)."""
+        xq = np.ascontiguousarray(xq, dtype="float32")
+        k = min(k, self.ntotal if rows is None else len(rows))
+        if k <= 0:
+            empty = np.empty((len(xq), 0))
+            return empty.astype("float32"), empty.astype("int64")
+        if rows is None:
+            return faiss.knn(xq, self.xb, k)
+        rows = np.asarray(rows, dtype="int64")
+        distances, indices = faiss.knn(xq, np.ascontiguousarray(self.xb[rows]), k)
+        return distances, np.where(indices >= 0, rows[indices], -1)
+
+    def reconstruct(self, i):
+        return np.array(self.xb[i], dtype="float32")
+
+
+class MmapFieldIndex:
+    """value -> rows lookup over a field index written by save_field_index()."""
+
+    def __init__(self, root, field):
+        self.keys, self.indptr, self.rows_by_key = (np.load(p, mmap_mode="r") for p in field_index_paths(root, field))
+
+    def rows(self, value):
+        pos = int(np.searchsorted(self.keys, value))
+        if pos < len(self.keys) and self.keys[pos] == value:
+            return self.rows_by_key[self.indptr[pos]:self.indptr[pos + 1]]
+        return self.rows_by_key[:0]
+
+
+class MmapMetadata:
+    """List-like view over the metadata blob; rows are decoded on access."""
+
+    def __init__(self, blob_path, offsets_path):
+        self.offsets = np.load(offsets_path, mmap_mode="r")
+        # np.memmap refuses zero-length files (empty ingest)
+        if os.path.getsize(blob_path) > 0:
+            self.blob = np.memmap(blob_path, dtype="uint8", mode="r")
+        else:
+            self.blob = np.zeros(0, dtype="uint8")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return json.loads(self.blob[start:end].tobytes().decode("utf-8"))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
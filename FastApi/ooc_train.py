@@ -0,0 +1,260 @@
+"""
+ooc_train.py
+- Out-of-core TF-IDF + SVD training for corpora larger than RAM.
+- Documents are streamed from the CSV in chunks (pd.read_csv(chunksize=...)); memory is bounded
+  by chunk size, VOCAB_FACTOR * max_features counted terms and the SVD sketch, never by the
+  number of documents or distinct terms.
+- Pass 1: per-chunk term/document frequencies on a process pool, merged into a Misra-Gries
+  summary of at most VOCAB_FACTOR * max_features terms. Every term whose count exceeds
+  total tokens / (capacity + 1) survives it. If the summary ever had to be pruned, one more
+  pass recounts exact frequencies of the surviving terms. The top max_features terms and IDF
+  weights then use the same selection and smoothing as TfidfVectorizer.
+- Passes 2..n_iter+1: randomized SVD by streaming subspace iteration; every pass sums the
+  per-chunk products X_c^T (X_c Q) computed on the process pool.
+- Last pass: the small Gram matrix (X Q)^T (X Q) gives the components and variances.
+- Returns a regular TfidfVectorizer/TruncatedSVD pair, so the pickles and the encoder export
+  are written exactly like the in-memory path and serving does not change.
+- Optional `progress(stage, done, total, unit)` callback is called after every chunk, and an
+  optional boolean `keep` mask drops rows (e.g. near-duplicates) from training.
+- CLI: python ooc_train.py data.csv
+"""
+
+import heapq
+import os
+import pickle
+import sys
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+MAX_FEATURES = 5000
+N_COMPONENTS = 100
+N_ITER = 5
+N_OVERSAMPLES = 10
+VOCAB_FACTOR = 20  # terms counted per vocabulary slot in pass 1
+CHUNK_SIZE = int(os.getenv("OOC_CHUNK_SIZE", "2000"))
+N_WORKERS = int(os.getenv("OOC_WORKERS", str(os.cpu_count() or 1)))
+
+
+def iter_text_chunks(csv_path, chunk_size=CHUNK_SIZE, keep=None):
+    """Yield lists of `title + " " + transcript`, the same combined_text as /ingest."""
+    offset = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size, usecols=["title", "transcript"]):
+        if keep is not None:
+            chunk_keep = keep[offset:offset + len(chunk)]
+            offset += len(chunk)
+            chunk = chunk[chunk_keep]
+            if chunk.empty:
+                # Every row of this chunk was a duplicate
+                continue
+        combined = chunk["title"].astype(str) + " " + chunk["transcript"].fillna("").astype(str)
+        yield combined.tolist()
+
+
+def bounded_map(pool, fn, iterable, max_in_flight):
+    """pool.map that keeps at most `max_in_flight` chunks queued; yields in completion order."""
+    pending = set()
+    for item in iterable:
+        if len(pending) >= max_in_flight:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield fut.result()
+        pending.add(pool.submit(fn, item))
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            yield fut.result()
+
+
+def stream_pass(csv_path, fn, initializer, initargs, chunk_size, n_workers, keep=None):
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=initializer, initargs=initargs) as pool:
+        yield from bounded_map(pool, fn, iter_text_chunks(csv_path, chunk_size, keep), 2 * n_workers)
+
+
+# ============================================================
+# Worker-side functions (state set once per pool by the initializers)
+# ============================================================
+_analyzer = None
+_candidates = None
+_tfidf = None
+_basis = None
+
+
+def _init_counter(candidates=None):
+    global _analyzer, _candidates
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    _analyzer = TfidfVectorizer(stop_words="english").build_analyzer()
+    _candidates = candidates
+
+
+def _count_chunk(texts):
+    tf, df = Counter(), Counter()
+    for text in texts:
+        counts = Counter(_analyzer(text))
+        if _candidates is not None:
+            counts = Counter({t: c for t, c in counts.items() if t in _candidates})
+        tf.update(counts)
+        df.update(counts.keys())
+    return len(texts), tf, df
+
+
+def _init_projector(tfidf, basis):
+    global _tfidf, _basis
+    _tfidf, _basis = tfidf, basis
+
+
+def _power_chunk(texts):
+    X = _tfidf.transform(texts)
+    return X.shape[0], X.T @ (X @ _basis)
+
+
+def _gram_chunk(texts):
+    X = _tfidf.transform(texts)
+    Y = X @ _basis
+    x_sum = np.asarray(X.sum(axis=0)).ravel()
+    x_sq = np.asarray(X.multiply(X).sum(axis=0)).ravel()
+    return X.shape[0], Y.T @ Y, Y.sum(axis=0), x_sum, x_sq
+
+
+# ============================================================
+# Training
+# ============================================================
+def _no_progress(stage, done=None, total=None, unit="rows"):
+    pass
+
+
+def prune_counts(tf, capacity):
+    """Misra-Gries step: subtract the (capacity+1)-th largest count and drop what reaches zero."""
+    if len(tf) <= capacity:
+        return tf
+    cut = heapq.nlargest(capacity + 1, tf.values())[-1]
+    return Counter({t: c - cut for t, c in tf.items() if c > cut})
+
+
+def build_vectorizer(csv_path, max_features=MAX_FEATURES, chunk_size=CHUNK_SIZE, n_workers=N_WORKERS,
+                     progress=_no_progress, total_docs=None, keep=None):
+    """Bounded vocabulary pass (plus an exact recount if it was pruned), then the top max_features terms."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    capacity = VOCAB_FACTOR * max_features
+    tf, df, n_docs = Counter(), Counter(), 0
+    for n, chunk_tf, chunk_df in stream_pass(csv_path, _count_chunk, _init_counter, (), chunk_size, n_workers, keep):
+        n_docs += n
+        tf.update(chunk_tf)
+        if df is not None:
+            df.update(chunk_df)
+        if len(tf) > capacity:
+            # Counts are lower bounds from here on; df is recounted for the survivors only
+            tf, df = prune_counts(tf, capacity), None
+        progress("vocabulary", n_docs, total_docs, "docs")
+
+    if df is None:
+        candidates = frozenset(tf)
+        tf, df, done = Counter(), Counter(), 0
+        for n, chunk_tf, chunk_df in stream_pass(csv_path, _count_chunk, _init_counter, (candidates,),
+                                                 chunk_size, n_workers, keep):
+            done += n
+            tf.update(chunk_tf)
+            df.update(chunk_df)
+            progress("vocabulary recount", done, total_docs, "docs")
+
+    top = heapq.nsmallest(max_features, tf.items(), key=lambda item: (-item[1], item[0]))
+    terms = sorted(term for term, _ in top)
+    idf = np.array([np.log((1 + n_docs) / (1 + df[t])) + 1 for t in terms], dtype="float64")
+
+    tfidf = TfidfVectorizer(stop_words="english", vocabulary={t: i for i, t in enumerate(terms)})
+    tfidf.idf_ = idf
+    return tfidf
+
+
+def fit_svd(csv_path, tfidf, n_components=N_COMPONENTS, n_iter=N_ITER, n_oversamples=N_OVERSAMPLES,
+            random_state=42, chunk_size=CHUNK_SIZE, n_workers=N_WORKERS, progress=_no_progress, total_docs=None,
+            keep=None):
+    """Randomized truncated SVD of the streamed TF-IDF matrix (no centering, like TruncatedSVD)."""
+    from sklearn.decomposition import TruncatedSVD
+
+    n_features = len(tfidf.vocabulary_)
+    n_components = min(n_components, n_features)
+    sketch = min(n_components + n_oversamples, n_features)
+    rng = np.random.default_rng(random_state)
+    basis, _ = np.linalg.qr(rng.standard_normal((n_features, sketch)))
+
+    for it in range(n_iter):
+        Z = np.zeros((n_features, sketch))
+        done = 0
+        for n, part in stream_pass(csv_path, _power_chunk, _init_projector, (tfidf, basis),
+                                   chunk_size, n_workers, keep):
+            Z += part
+            done += n
+            progress(f"svd pass {it + 1}/{n_iter + 1}", done, total_docs, "docs")
+        basis, _ = np.linalg.qr(Z)
+
+    n_docs = 0
+    gram = np.zeros((sketch, sketch))
+    y_sum = np.zeros(sketch)
+    x_sum = np.zeros(n_features)
+    x_sq = np.zeros(n_features)
+    for n, g, ys, xs, xq in stream_pass(csv_path, _gram_chunk, _init_projector, (tfidf, basis),
+                                         chunk_size, n_workers, keep):
+        n_docs += n
+        gram += g
+        y_sum += ys
+        x_sum += xs
+        x_sq += xq
+        progress(f"svd pass {n_iter + 1}/{n_iter + 1}", n_docs, total_docs, "docs")
+
+    eigvals, eigvecs = np.linalg.eigh(gram)
+    order = np.argsort(eigvals)[::-1][:n_components]
+    eigvals = np.clip(eigvals[order], 0, None)
+    eigvecs = eigvecs[:, order]
+    components = (basis @ eigvecs).T
+
+    # Same sign convention as sklearn's svd_flip(u_based_decision=False)
+    signs = np.sign(components[np.arange(n_components), np.argmax(np.abs(components), axis=1)])
+    signs[signs == 0] = 1
+    components *= signs[:, None]
+    t_mean = (y_sum @ eigvecs) * signs / n_docs
+    explained_variance = eigvals / n_docs - t_mean ** 2
+    full_variance = (x_sq / n_docs - (x_sum / n_docs) ** 2).sum()
+
+    svd = TruncatedSVD(n_components=n_components, algorithm="randomized", n_iter=n_iter,
+                       n_oversamples=n_oversamples, random_state=random_state)
+    svd.components_ = components
+    svd.singular_values_ = np.sqrt(eigvals)
+    svd.explained_variance_ = explained_variance
+    svd.explained_variance_ratio_ = explained_variance / full_variance
+    svd.n_features_in_ = n_features
+    return svd
+
+
+def train_out_of_core(csv_path, max_features=MAX_FEATURES, n_components=N_COMPONENTS,
+                      chunk_size=CHUNK_SIZE, n_workers=N_WORKERS, progress=_no_progress, total_docs=None,
+                      keep=None):
+    tfidf = build_vectorizer(csv_path, max_features, chunk_size, n_workers, progress, total_docs, keep)
+    svd = fit_svd(csv_path, tfidf, n_components, chunk_size=chunk_size, n_workers=n_workers,
+                  progress=progress, total_docs=total_docs, keep=keep)
+    return tfidf, svd
+
+
+def main():
+    from encoder import ENCODER_DIR, export_encoder
+    from mmap_store import atomic_write
+
+    if len(sys.argv) < 2:
+        print("Usage: python ooc_train.py data.csv")
+        sys.exit(1)
+
+    tfidf, svd = train_out_of_core(sys.argv[1])
+    os.makedirs("models", exist_ok=True)
+    atomic_write("models/tfidf.pkl", lambda f: pickle.dump(tfidf, f))
+    atomic_write("models/svd.pkl", lambda f: pickle.dump(svd, f))
+    export_encoder(tfidf, svd, ENCODER_DIR)
+    print(f"✓ Trained on {sys.argv[1]}: {len(tfidf.vocabulary_)} terms, "
+          f"{svd.components_.shape[0]} components, "
+          f"{svd.explained_variance_ratio_.sum():.1%} variance explained")
+
+
+if __name__ == "__main__":
+    main()
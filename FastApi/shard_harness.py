@@ -0,0 +1,96 @@
+"""
+shard_harness.py
+- Local multi-process check for shards.py, no API server needed:
+  python shard_harness.py --rows 20000 --dim 100 --shards 4
+- Builds random shards in a temp dir, runs ShardedSearcher (one process per shard) and checks:
+  0. the first query after start-up is answered by every shard within the default timeout,
+  1. scatter-gather top-k matches a brute-force search over all rows,
+  2. a stalled shard is reported as missing and the other shards still answer,
+  3. rebuilding one shard is picked up by its worker without restarting the pool.
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from shards import DEFAULT_TIMEOUT, ShardedSearcher, shard_of, write_shards
+
+
+def make_records(n, num_channels=50):
+    return [{"video_id": f"vid_{i}", "title": f"Video {i}", "channel_title": f"channel_{i % num_channels}"}
+            for i in range(n)]
+
+
+def brute_force(embeddings, records, q, k):
+    d = ((embeddings - q) ** 2).sum(axis=1)
+    top = np.argsort(d, kind="stable")[:k]
+    return [records[i]["video_id"] for i in top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=100)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--shard-by", default="video_id", choices=["video_id", "channel"])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    embeddings = rng.standard_normal((args.rows, args.dim)).astype("float32")
+    records = make_records(args.rows)
+
+    with tempfile.TemporaryDirectory() as root:
+        written = write_shards(root, embeddings, records, args.shards, args.shard_by)
+        print(f"Wrote {args.rows} rows into {args.shards} shards: {written}")
+
+        searcher = ShardedSearcher(root, timeout=10.0)
+        try:
+            # 0. Worker processes are up once the searcher exists: the first query meets the default timeout
+            hits, missing = searcher.search(rng.standard_normal((1, args.dim)).astype("float32"), args.k,
+                                            timeout=DEFAULT_TIMEOUT)
+            print(f"✓ First query: {len(hits)} hits, missing={missing}")
+            assert not missing and len(hits) == args.k
+
+            # 1. Exactness against brute force
+            queries = rng.standard_normal((args.queries, args.dim)).astype("float32")
+            start = time.perf_counter()
+            mismatches = 0
+            for q in queries:
+                hits, missing = searcher.search(q[None, :], args.k)
+                assert not missing, f"Unexpected missing shards: {missing}"
+                got = [rec["video_id"] for _, rec in hits]
+                if got != brute_force(embeddings, records, q, args.k):
+                    mismatches += 1
+            elapsed = (time.perf_counter() - start) / args.queries * 1000
+            print(f"✓ {args.queries} queries, {mismatches} top-{args.k} mismatches, {elapsed:.2f} ms/query")
+            assert mismatches == 0
+
+            # 2. Slow shard -> partial results within the timeout
+            searcher.pools[0].submit(time.sleep, 2.0)
+            start = time.perf_counter()
+            hits, missing = searcher.search(queries[:1], args.k, timeout=0.3)
+            elapsed = time.perf_counter() - start
+            print(f"✓ Slow shard: missing={missing}, {len(hits)} hits in {elapsed:.2f}s")
+            assert missing == [0] and elapsed < 1.0
+            time.sleep(2.0)
+
+            # 3. Independent rebuild of one shard: its rows move onto the query point
+            target = 1 % args.shards
+            write_shards(root, np.zeros_like(embeddings), records, args.shards, args.shard_by, only=[target])
+            hits, missing = searcher.search(np.zeros((1, args.dim), dtype="float32"), args.k)
+            key = "video_id" if args.shard_by == "video_id" else "channel_title"
+            from_target = [rec for d, rec in hits if d == 0.0 and shard_of(rec[key], args.shards) == target]
+            print(f"✓ Rebuilt shard {target}: {len(from_target)} of top-{args.k} hits now come from it")
+            assert not missing and len(from_target) == len(hits) == args.k
+        finally:
+            searcher.close()
+
+    print("All shard checks passed")
+
+
+if __name__ == "__main__":
+    main()
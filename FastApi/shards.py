@@ -0,0 +1,224 @@
+"""
+shards.py
+- Partitions the catalogue into N shards, by hash of video_id or by channel_title.
+- Each shard is its own directory in the mmap_store layout (vectors.npy + metadata blob),
+  so one shard can be rewritten without touching the others.
+- ShardedSearcher runs one worker process per shard, fans every query out in parallel and
+  merges the per-shard top-k with a heap. Shards that miss the timeout are skipped and
+  reported, so a slow shard degrades results instead of stalling /search.
+- A timed-out query keeps running in its shard process (only queued ones can be cancelled),
+  so each shard accepts at most MAX_IN_FLIGHT queries; a shard at the cap is reported missing
+  right away instead of growing a backlog behind the slow query.
+- Metadata filters run inside every shard (backends.search_where), so each shard returns its
+  own k best matches and the merge has the same k as the single index.
+"""
+
+import heapq
+import json
+import multiprocessing
+import os
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import numpy as np
+
+from backends import FILTER_FIELDS, open_field_indexes, search_where
+from mmap_store import MmapIndex, MmapMetadata, atomic_write, save_field_index, save_metadata, save_vectors
+
+SHARD_DIR = "models/shards"
+MANIFEST_NAME = "manifest.json"
+SHARD_KEYS = {"video_id": "video_id", "channel": "channel_title"}
+DEFAULT_TIMEOUT = float(os.getenv("SHARD_TIMEOUT", "0.5"))
+MAX_IN_FLIGHT = int(os.getenv("SHARD_MAX_IN_FLIGHT", "4"))
+
+
+def shard_of(key, num_shards):
+    """Stable shard id for a key (crc32, so it is the same in every process and run)."""
+    return zlib.crc32(str(key).encode("utf-8")) % num_shards
+
+
+def shard_path(root, shard_id):
+    return os.path.join(root, f"shard_{shard_id:03d}")
+
+
+def manifest_path(root):
+    return os.path.join(root, MANIFEST_NAME)
+
+
+def read_manifest(root=SHARD_DIR):
+    path = manifest_path(root)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def remove_manifest(root=SHARD_DIR):
+    """Switch serving back to the single index (shard files are left for reuse)."""
+    if os.path.exists(manifest_path(root)):
+        os.remove(manifest_path(root))
+
+
+def write_shards(root, embeddings, records, num_shards, shard_by="video_id", only=None):
+    """
+    Split rows across shards and write them. With `only`, just those shard ids are rewritten
+    (rows hashing elsewhere are ignored) and the existing manifest must match.
+    Returns {shard_id: row_count} for the shards written.
+    """
+    if shard_by not in SHARD_KEYS:
+        raise ValueError(f"shard_by must be one of {sorted(SHARD_KEYS)}")
+    if num_shards < 1:
+        raise ValueError("num_shards must be >= 1")
+
+    manifest = read_manifest(root)
+    if only is not None:
+        if manifest is None or manifest["num_shards"] != num_shards or manifest["shard_by"] != shard_by:
+            raise ValueError("Partial shard rebuild needs an existing manifest with the same num_shards/shard_by")
+        bad = [s for s in only if not 0 <= s < num_shards]
+        if bad:
+            raise ValueError(f"Unknown shard ids: {bad}")
+
+    key = SHARD_KEYS[shard_by]
+    assignment = np.array([shard_of(r.get(key), num_shards) for r in records], dtype="int64")
+    targets = range(num_shards) if only is None else sorted(set(only))
+
+    written = {}
+    for shard_id in targets:
+        rows = np.flatnonzero(assignment == shard_id)
+        path = shard_path(root, shard_id)
+        os.makedirs(path, exist_ok=True)
+        shard_records = [records[i] for i in rows]
+        for field in FILTER_FIELDS:
+            save_field_index(path, shard_records, field)
+        save_metadata(os.path.join(path, "metadata.bin"), os.path.join(path, "metadata_offsets.npy"),
+                      shard_records)
+        # vectors.npy is the workers' reload trigger, so it is swapped in last
+        save_vectors(os.path.join(path, "vectors.npy"), embeddings[rows])
+        written[shard_id] = int(len(rows))
+
+    if only is None:
+        manifest = {"num_shards": num_shards, "shard_by": shard_by}
+        atomic_write(manifest_path(root), lambda f: json.dump(manifest, f), mode="w")
+    return written
+
+
+# ============================================================
+# Shard worker process
+# ============================================================
+_shard_dir = None
+_shard_index = None
+_shard_metadata = None
+_shard_field_indexes = {}
+_shard_version = None
+
+
+def _open_shard(path):
+    global _shard_dir
+    _shard_dir = path
+    _reload_shard()
+
+
+def _reload_shard():
+    """(Re)map this worker's shard if it was rebuilt since the last query. write_shards() replaces
+    vectors.npy after the metadata, so a new vectors file means the whole shard is new."""
+    global _shard_index, _shard_metadata, _shard_field_indexes, _shard_version
+    vectors = os.path.join(_shard_dir, "vectors.npy")
+    stat = os.stat(vectors)
+    version = (stat.st_mtime_ns, stat.st_ino)
+    if version != _shard_version:
+        _shard_index = MmapIndex(vectors)
+        _shard_metadata = MmapMetadata(os.path.join(_shard_dir, "metadata.bin"),
+                                       os.path.join(_shard_dir, "metadata_offsets.npy"))
+        _shard_field_indexes = open_field_indexes(_shard_dir)
+        _shard_version = version
+
+
+def _shard_search(xq, k, where=None):
+    _reload_shard()
+    if where:
+        return [search_where(_shard_index, _shard_metadata, _shard_field_indexes, xq, k, where)]
+    distances, indices = _shard_index.search(xq, k)
+    return [
+        [(float(d), _shard_metadata[int(i)]) for d, i in zip(row_d, row_i) if i >= 0]
+        for row_d, row_i in zip(distances, indices)
+    ]
+
+
+# ============================================================
+# Scatter-gather coordinator
+# ============================================================
+class ShardedSearcher:
+    def __init__(self, root=SHARD_DIR, timeout=DEFAULT_TIMEOUT, max_in_flight=MAX_IN_FLIGHT):
+        manifest = read_manifest(root)
+        if manifest is None:
+            raise FileNotFoundError(f"No shard manifest in {root}. Ingest with num_shards > 0 first.")
+        self.root = root
+        self.num_shards = manifest["num_shards"]
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.in_flight = [0] * self.num_shards
+        self.in_flight_lock = threading.Lock()
+        ctx = multiprocessing.get_context("spawn")
+        self.pools = [
+            ProcessPoolExecutor(max_workers=1, mp_context=ctx, initializer=_open_shard,
+                                initargs=(shard_path(root, s),))
+            for s in range(self.num_shards)
+        ]
+        # Pools start their process lazily; pay interpreter start-up and imports here, not
+        # against the first query's timeout
+        wait([pool.submit(_reload_shard) for pool in self.pools])
+
+    def search(self, xq, k, timeout=None, where=None):
+        """
+        Returns (hits, missing_shards) for the first query row; hits are (distance, record)
+        sorted by distance, missing_shards lists shards that failed or timed out. `where`
+        keeps only records matching it, as in FaissStore.search.
+        """
+        xq = np.ascontiguousarray(xq, dtype="float32")
+        futures, missing = {}, []
+        for s in range(self.num_shards):
+            fut = self._submit(s, xq, k, where)
+            if fut is None:
+                missing.append(s)
+            else:
+                futures[fut] = s
+        done, not_done = wait(futures, timeout=self.timeout if timeout is None else timeout)
+
+        per_shard = []
+        for fut in done:
+            if fut.exception() is not None:
+                missing.append(futures[fut])
+            else:
+                per_shard.append(fut.result()[0])
+        for fut in not_done:
+            fut.cancel()
+            missing.append(futures[fut])
+
+        # Each shard list is already sorted by distance
+        merged = heapq.merge(*per_shard, key=lambda hit: hit[0])
+        hits = [hit for _, hit in zip(range(k), merged)]
+        return hits, sorted(missing)
+
+    def _submit(self, s, xq, k, where):
+        """Queue a query on shard `s`, or None if it is still busy with MAX_IN_FLIGHT older ones."""
+        with self.in_flight_lock:
+            if self.in_flight[s] >= self.max_in_flight:
+                return None
+            self.in_flight[s] += 1
+        try:
+            fut = self.pools[s].submit(_shard_search, xq, k, where)
+        except RuntimeError:
+            # Pool shut down by close() (snapshot switched) or broken
+            self._finished(s)
+            return None
+        fut.add_done_callback(lambda _, s=s: self._finished(s))
+        return fut
+
+    def _finished(self, s):
+        with self.in_flight_lock:
+            self.in_flight[s] -= 1
+
+    def close(self):
+        for pool in self.pools:
+            pool.shutdown(wait=False, cancel_futures=True)
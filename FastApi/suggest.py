@@ -0,0 +1,137 @@
+"""
+suggest.py
+- Prefix / typeahead index over video titles and channel names for /suggest?prefix=.
+- Suggestions (distinct titles and channels) are numbered by descending view count, so the
+  best N suggestions for a prefix are simply the N smallest suggestion ids among its matches.
+- Keys are the lower-cased strings from each word start (at most MAX_WORD_STARTS per string,
+  each cut to MAX_KEY_LEN chars, so memory per indexed string is bounded), kept in one sorted
+  array; the matches of a prefix are a contiguous range found by binary search.
+- Prefixes matching more than SCAN_LIMIT keys are "hot": their top-N ids are precomputed at
+  build time. Any other prefix has a short range that is scanned directly. Either way a lookup
+  is two binary searches plus at most SCAN_LIMIT ids.
+- All arrays are .npy files memory-mapped at serving time; suggestion records use the
+  mmap_store metadata blob.
+"""
+
+import os
+
+import numpy as np
+
+from mmap_store import MmapMetadata, atomic_write, save_metadata
+
+SUGGEST_DIR = "models/suggest"
+TOP_N = 10
+SCAN_LIMIT = 256
+MAX_KEY_LEN = 32
+MAX_WORD_STARTS = 6
+KEY_FILES = ["keys.npy", "key_ids.npy", "hot_prefixes.npy", "hot_indptr.npy", "hot_ids.npy"]
+_PREFIX_END = "\U0010ffff"
+
+
+def normalize(text):
+    return " ".join(str(text).lower().split())
+
+
+def word_start_keys(text):
+    """Keys for `text`: the string from each of its first MAX_WORD_STARTS word starts."""
+    words = normalize(text).split(" ")
+    return {" ".join(words[i:])[:MAX_KEY_LEN] for i in range(min(len(words), MAX_WORD_STARTS)) if words[i]}
+
+
+def _suggestions(records):
+    """Distinct title/channel suggestions with their view counts, best first."""
+    titles, channels = {}, {}
+    for rec in records:
+        views = rec.get("view_count") or 0
+        title = " ".join(str(rec.get("title") or "").split())
+        if title:
+            best = titles.get(title.lower())
+            if best is None or views > best["view_count"]:
+                titles[title.lower()] = {"text": title, "type": "title", "video_id": rec.get("video_id"),
+                                         "view_count": views}
+        channel = " ".join(str(rec.get("channel_title") or "").split())
+        if channel:
+            entry = channels.setdefault(channel.lower(), {"text": channel, "type": "channel", "view_count": 0})
+            entry["view_count"] += views
+    return sorted(list(titles.values()) + list(channels.values()), key=lambda s: (-s["view_count"], s["text"]))
+
+
+def build_suggest_index(records, root=SUGGEST_DIR):
+    suggestions = _suggestions(records)
+    keys, key_ids = [], []
+    for sid, sugg in enumerate(suggestions):
+        for key in word_start_keys(sugg["text"]):
+            keys.append(key)
+            key_ids.append(sid)
+
+    keys = np.asarray(keys, dtype=f"<U{MAX_KEY_LEN}")
+    key_ids = np.asarray(key_ids, dtype="int32")
+    # Stable sort keeps the ids ascending within equal keys
+    order = np.argsort(keys, kind="stable")
+    keys, key_ids = keys[order], key_ids[order]
+
+    # Hot prefixes, depth by depth: truncating the sorted keys keeps them sorted
+    hot_prefixes, hot_lists = [], []
+    for depth in range(1, MAX_KEY_LEN + 1):
+        prefixes = keys.astype(f"<U{depth}")
+        full = np.char.str_len(prefixes) == depth
+        uniq, starts, counts = np.unique(prefixes[full], return_index=True, return_counts=True)
+        starts = np.flatnonzero(full)[starts]
+        hot = counts > SCAN_LIMIT
+        if not hot.any():
+            break
+        for prefix, start, count in zip(uniq[hot], starts[hot], counts[hot]):
+            hot_prefixes.append(str(prefix))
+            hot_lists.append(np.unique(key_ids[start:start + count])[:TOP_N])
+
+    order = np.argsort(np.asarray(hot_prefixes, dtype=f"<U{MAX_KEY_LEN}"), kind="stable")
+    hot_indptr = np.zeros(len(hot_lists) + 1, dtype="int64")
+    hot_indptr[1:] = np.cumsum([len(hot_lists[i]) for i in order])
+    hot_ids = (np.concatenate([hot_lists[i] for i in order]) if hot_lists else np.zeros(0)).astype("int32")
+
+    os.makedirs(root, exist_ok=True)
+    arrays = {
+        "keys.npy": keys,
+        "key_ids.npy": key_ids,
+        "hot_prefixes.npy": np.asarray(hot_prefixes, dtype=f"<U{MAX_KEY_LEN}")[order],
+        "hot_indptr.npy": hot_indptr,
+        "hot_ids.npy": hot_ids,
+    }
+    for name, arr in arrays.items():
+        atomic_write(os.path.join(root, name), lambda f: np.save(f, arr))
+    save_metadata(os.path.join(root, "suggestions.bin"), os.path.join(root, "suggestions_offsets.npy"), suggestions)
+    return {"suggestions": len(suggestions), "keys": len(keys), "hot_prefixes": len(hot_prefixes)}
+
+
+def suggest_index_exists(root=SUGGEST_DIR):
+    names = KEY_FILES + ["suggestions.bin", "suggestions_offsets.npy"]
+    return all(os.path.exists(os.path.join(root, name)) for name in names)
+
+
+class SuggestIndex:
+    def __init__(self, root=SUGGEST_DIR):
+        self.keys, self.key_ids, self.hot_prefixes, self.hot_indptr, self.hot_ids = (
+            np.load(os.path.join(root, name), mmap_mode="r") for name in KEY_FILES
+        )
+        self.suggestions = MmapMetadata(os.path.join(root, "suggestions.bin"),
+                                        os.path.join(root, "suggestions_offsets.npy"))
+
+    def top_ids(self, prefix, n=TOP_N):
+        """Ids of the best min(n, TOP_N) suggestions; hot prefixes only store TOP_N."""
+        n = min(n, TOP_N)
+        prefix = normalize(prefix)[:MAX_KEY_LEN]
+        if not prefix or n <= 0:
+            return []
+        pos = int(np.searchsorted(self.hot_prefixes, prefix))
+        if pos < len(self.hot_prefixes) and self.hot_prefixes[pos] == prefix:
+            return self.hot_ids[self.hot_indptr[pos]:self.hot_indptr[pos + 1]][:n].tolist()
+        lo = int(np.searchsorted(self.keys, prefix, side="left"))
+        if len(prefix) == MAX_KEY_LEN:
+            # Full-length prefix: only keys equal to it can match
+            hi = int(np.searchsorted(self.keys, prefix, side="right"))
+        else:
+            hi = int(np.searchsorted(self.keys, prefix + _PREFIX_END, side="left"))
+        return np.unique(self.key_ids[lo:hi])[:n].tolist()
+
+    def suggest(self, prefix, n=TOP_N):
+        return [self.suggestions[i] for i in self.top_ids(prefix, n)]
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sklearn")
+
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from encoder import QueryEncoder, export_encoder
+
+CORPUS = [
+    "Artificial intelligence is changing how we work and learn",
+    "Climate change and the future of the ocean",
+    "How to learn faster: the science of memory",
+    "Deep learning and neural networks explained",
+    "The ocean is warming faster than expected",
+    "Machine learning for beginners, an introduction to artificial intelligence",
+    "Why sleep matters for memory and learning",
+    "Renewable energy and the fight against climate change",
+]
+QUERIES = ["artificial intelligence", "How to learn FASTER", "climate change and the ocean", "zzzz", ""]
+
+
+def fit(**tfidf_options):
+    tfidf = TfidfVectorizer(stop_words="english", **tfidf_options)
+    svd = TruncatedSVD(n_components=4, random_state=42)
+    svd.fit(tfidf.fit_transform(CORPUS))
+    return tfidf, svd
+
+
+@pytest.mark.parametrize("tfidf_options", [{}, {"sublinear_tf": True, "ngram_range": (1, 2)}])
+def test_transform_matches_sklearn(tmp_path, tfidf_options):
+    tfidf, svd = fit(**tfidf_options)
+    export_encoder(tfidf, svd, str(tmp_path))
+    encoder = QueryEncoder(str(tmp_path))
+
+    expected = svd.transform(tfidf.transform(QUERIES))
+    np.testing.assert_allclose(encoder.transform(QUERIES), expected, atol=1e-10)
+    np.testing.assert_allclose(encoder.transform_reference(QUERIES), expected, atol=1e-10)
+
+
+def test_transform_without_projection_table(tmp_path):
+    # Encoders exported before term_proj.npy existed build the table on load
+    tfidf, svd = fit()
+    export_encoder(tfidf, svd, str(tmp_path))
+    os.remove(os.path.join(tmp_path, "term_proj.npy"))
+
+    expected = svd.transform(tfidf.transform(QUERIES))
+    np.testing.assert_allclose(QueryEncoder(str(tmp_path)).transform(QUERIES), expected, atol=1e-10)
@@ -0,0 +1,43 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("faiss")
+
+from knn_graph import build_knn_graph, update_knn_graph
+
+
+def random_vectors(n, dim=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype("float32")
+
+
+def assert_same_graph(got, expected):
+    got_indptr, got_indices, got_distances = got
+    indptr, indices, distances = expected
+    np.testing.assert_array_equal(got_indptr, indptr)
+    np.testing.assert_array_equal(got_indices, indices)
+    np.testing.assert_allclose(got_distances, distances, rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize("changed_rows, appended", [
+    ([], 30),
+    ([3, 17, 150], 0),
+    ([0, 42, 99, 199], 25),
+])
+def test_update_matches_full_build(changed_rows, appended):
+    k = 5
+    old = random_vectors(200)
+    graph = build_knn_graph(old, k=k)
+
+    vectors = np.vstack([old, random_vectors(appended, seed=1)])
+    vectors[changed_rows] = random_vectors(len(changed_rows), seed=2)
+
+    updated = update_knn_graph(graph, vectors, changed_rows, len(old), k=k)
+    assert_same_graph(updated, build_knn_graph(vectors, k=k))
+
+
+def test_build_excludes_self_and_sorts_by_distance():
+    indptr, indices, distances = build_knn_graph(random_vectors(50), k=4)
+    assert np.all(np.diff(indptr) == 4)
+    for row in range(50):
+        assert row not in indices[indptr[row]:indptr[row + 1]]
+        assert np.all(np.diff(distances[indptr[row]:indptr[row + 1]]) >= 0)
@@ -0,0 +1,90 @@
+"""
+versions.py
+- Every build writes all of its serving artefacts (vectors, metadata, field indexes, k-NN
+  graph, suggest index, shards, encoder, pickles, Chroma store) into a fresh
+  models/v<timestamp>/ directory, then switches models/CURRENT, one small file swapped with
+  os.replace(), to that directory.
+- Workers reload only when CURRENT changes and open everything from the directory it names,
+  so a request never mixes files of two builds. Files in a published directory are not
+  rewritten (a partial shard rebuild only touches that snapshot's shards, which reload on
+  their own vectors.npy).
+- The KEEP_VERSIONS newest directories are kept for workers still serving an older one;
+  older directories are removed when a new one is published.
+- Without CURRENT (models ingested before versioned directories) everything is read from
+  models/ itself.
+"""
+
+import os
+import re
+import shutil
+import time
+
+from mmap_store import atomic_write
+
+MODELS_DIR = "models"
+CURRENT_NAME = "CURRENT"
+KEEP_VERSIONS = 2
+_VERSION_RE = re.compile(r"v\d+")
+
+
+def current_version(root=MODELS_DIR):
+    """Name of the published version directory, or None for the unversioned layout."""
+    try:
+        with open(os.path.join(root, CURRENT_NAME), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return name if _VERSION_RE.fullmatch(name) else None
+
+
+def current_dir(root=MODELS_DIR):
+    name = current_version(root)
+    return os.path.join(root, name) if name else root
+
+
+def new_version_dir(root=MODELS_DIR):
+    """Create an unpublished version directory for a build to write into."""
+    while True:
+        name = f"v{time.time_ns()}"
+        try:
+            os.makedirs(os.path.join(root, name))
+            return os.path.join(root, name)
+        except FileExistsError:
+            continue
+
+
+def link_or_copy(src, dst):
+    """Reuse an unchanged file (or directory of files) from a published version."""
+    if os.path.isdir(src):
+        os.makedirs(dst, exist_ok=True)
+        for name in os.listdir(src):
+            link_or_copy(os.path.join(src, name), os.path.join(dst, name))
+        return
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def versions(root=MODELS_DIR):
+    names = [name for name in os.listdir(root) if _VERSION_RE.fullmatch(name)]
+    return sorted(names, key=lambda name: int(name[1:]))
+
+
+def publish(path, root=MODELS_DIR):
+    """Make `path` the served version. Returns the version directories that were pruned."""
+    name = os.path.basename(path)
+    atomic_write(os.path.join(root, CURRENT_NAME), lambda f: f.write(name), mode="w")
+    keep = set(versions(root)[-KEEP_VERSIONS:]) | {name}
+    pruned = []
+    for old in versions(root):
+        if old not in keep and int(old[1:]) < int(name[1:]):
+            # Workers still mapping these files keep them alive (POSIX); elsewhere removal is retried later
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+            pruned.append(old)
+    return pruned
+
+
+def discard(path):
+    """Remove a version directory that was never published (failed or cancelled build)."""
+    shutil.rmtree(path, ignore_errors=True)